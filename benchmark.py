@@ -0,0 +1,123 @@
+from core import generate_image
+from core.generators import generate_scene
+from core.raytracing import prepare
+from core.statistics import Statistics
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import get_context
+from time import perf_counter
+import argparse, json, platform, resource, sys
+import numpy as np, vtk
+
+SCENES = ["spheres", "bevel-gear", "test", "lights"]
+RESOLUTIONS = ["90x60", "180x120", "450x300"]
+DEPTHS = [1, 3]
+
+
+def run_case(name, width, height, max_depth, backend, mode):
+    """
+    Render a shipped configuration and return its measurements
+    It runs in a fresh process so that the peak memory belongs to this case only
+    """
+    with open(f"./configurations/{name}-config.json", "r") as f:
+        configuration = json.load(f)
+    zoom = configuration["scene"][2]
+    start = perf_counter()
+    scene = generate_scene(configuration)
+    prepare(scene, backend)
+    setup = perf_counter() - start
+
+    stats = Statistics()
+    start = perf_counter()
+    generate_image(scene, max_depth, width, height, zoom, backend, mode, display=False, stats=stats)
+    duration = perf_counter() - start
+
+    report = stats.report()
+    return {
+        "scene": name,
+        "width": width,
+        "height": height,
+        "max_depth": max_depth,
+        "backend": backend,
+        "mode": mode,
+        "setup": setup,
+        "time": duration,
+        "rays_per_second": report["total_rays"] / duration,
+        **report,
+        # kilobytes on Linux
+        "peak_memory": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def case_key(case):
+    fields = ["scene", "width", "height", "max_depth", "backend", "mode"]
+    return tuple(case[field] for field in fields)
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the cases whose throughput dropped by more than `threshold` from the baseline
+    """
+    reference = {case_key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = reference.get(case_key(case))
+        if old is None:
+            continue
+        ratio = case["rays_per_second"] / old["rays_per_second"]
+        if ratio < 1 - threshold:
+            regressions.append((case, ratio))
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the rendering of shipped scenes")
+    parser.add_argument("--scenes", nargs="+", default=SCENES, help="names of configurations")
+    parser.add_argument("--resolutions", nargs="+", default=RESOLUTIONS, help="WIDTHxHEIGHT")
+    parser.add_argument("--depths", nargs="+", type=int, default=DEPTHS)
+    parser.add_argument("--backends", nargs="+", default=["analytic"])
+    parser.add_argument("--modes", nargs="+", default=["wavefront"])
+    parser.add_argument("-o", "--output", help="file where results are written as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown ratio")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    resolutions = [tuple(map(int, resolution.split("x"))) for resolution in args.resolutions]
+    cases = product(args.scenes, resolutions, args.depths, args.backends, args.modes)
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "vtk": vtk.vtkVersion.GetVTKVersion(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "cases": [],
+    }
+    for name, (width, height), max_depth, backend, mode in cases:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            future = pool.submit(run_case, name, width, height, max_depth, backend, mode)
+            case = future.result()
+        results["cases"].append(case)
+        stages = ", ".join(f"{stage} {time:.3f}s" for stage, time in case["times"].items())
+        print(
+            f"{name} {width}x{height} depth={max_depth} {backend}/{mode}: "
+            f"setup {case['setup']:.3f}s, render {case['time']:.3f}s, "
+            f"{case['rays_per_second']:,.0f} rays/s, "
+            f"{case['peak_memory'] / 2**20:.0f} MiB ({stages})"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for case, ratio in regressions:
+            print(f"Regression: {case_key(case)} runs at {ratio:.0%} of the baseline")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,146 @@
+from rich.progress import Progress
+from .lights import tile_generator
+from .statistics import DISABLED
+from .wavefront import primary_rays, screen_rays, trace_rays, trace_tiles
+import numpy as np
+
+SAMPLES = 16  # maximum number of samples of a pixel
+THRESHOLD = 0.1  # tolerated error on the color of a pixel
+
+# Corners of the quadrants of a pixel (in pixels, from its centre)
+QUADRANTS = np.array([(-0.5, -0.5), (0, -0.5), (-0.5, 0), (0, 0)])
+
+
+def contrast(image):
+    """
+    Return the largest difference (over channels) between each pixel and its 4 neighbours
+    """
+    contrasts = np.zeros(image.shape[:2])
+    vertical = np.abs(np.diff(image, axis=0)).max(axis=2)
+    horizontal = np.abs(np.diff(image, axis=1)).max(axis=2)
+    for view, difference in (
+        (contrasts[:-1], vertical),
+        (contrasts[1:], vertical),
+        (contrasts[:, :-1], horizontal),
+        (contrasts[:, 1:], horizontal),
+    ):
+        np.maximum(view, difference, out=view)
+    return contrasts
+
+
+def apron(sums, tile, width, height, trace):
+    """
+    Return the colors of the tile surrounded by the colors of the pixels around it
+    (one pixel wide, within the frame), so that contrasts at the borders of the tile
+    are the ones of the whole frame
+    `trace` returns the colors of pixels given their rows and columns in the frame
+    """
+    top, bottom, left, right = tile
+    rows = np.arange(max(top - 1, 0), min(bottom + 1, height))
+    columns = np.arange(max(left - 1, 0), min(right + 1, width))
+    colors = np.zeros((len(rows), len(columns), 3))
+    inside = (slice(top - rows[0], bottom - rows[0]), slice(left - columns[0], right - columns[0]))
+    colors[inside] = sums
+    ring = np.ones(colors.shape[:2], dtype=bool)
+    ring[inside] = False
+    if ring.any():
+        i, j = np.nonzero(ring)
+        colors[i, j] = trace(rows[i], columns[j])
+    return colors, inside
+
+
+def stratified_offsets(count, generator):
+    """
+    Return the offsets `(x, y)` (in pixels) of 4 sub-samples for `count` pixels,
+    one sub-sample jittered in each quadrant of the pixel
+    """
+    return (QUADRANTS + 0.5 * generator.random((count, 4, 2))).reshape(-1, 2)
+
+
+def generate_adaptive(
+    scene,
+    intersect,
+    occlude,
+    max_depth=3,
+    width=300,
+    height=200,
+    zoom=20,
+    tile=None,
+    display=True,
+    primitives=False,
+    stats=DISABLED,
+    samples=SAMPLES,
+    threshold=THRESHOLD,
+    kernels=False,
+    shadows=None,
+):
+    """
+    Return the image and the number of samples of each pixel
+    A ray goes through the centre of each pixel, then rounds add 4 stratified sub-samples
+    to the pixels which need them, up to `samples` per pixel (rounded up to `1 + 4 * k`):
+    - the first round to pixels differing from a neighbour by more than `threshold`,
+      neighbours outside the tile included (see `apron`) so that tiles refine their borders
+      as the whole frame does
+    - the next rounds to pixels whose color is still uncertain by more than `threshold`
+      (standard error of the mean of their samples)
+    Rays are traced as wavefronts (see `core.wavefront`), sub-samples are seeded by the
+    origin of the tile so that renderings are reproducible and tiles have their own jitter
+    `kernels` shades with compiled kernels (see `core.jit`)
+    `shadows` bounds the number of shadow rays of each intersection (see `trace_rays`)
+    """
+    top, bottom, left, right = tile = tile or (0, height, 0, width)
+    shape = (bottom - top, right - left)
+    render = scene.compile(primitives, kernels)
+    ratio = width / height
+    # Position and spacing of pixels on the screen (see `primary_rays`)
+    screen = (-1, 1 / ratio)
+    spacing = (2 / max(width - 1, 1), -2 / ratio / max(height - 1, 1))
+    functions = (render, intersect, occlude)
+
+    stats.start(*shape)
+    origin, directions = primary_rays(scene, width, height, zoom, tile)
+    # Shadow rays and sub-samples are drawn from the same generator
+    generator = tile_generator(tile)
+    args = (origin, directions, shape, max_depth, False, stats, shadows, generator)
+    sums = trace_tiles(*functions, *args)
+
+    def trace(rows, columns):
+        x = np.linspace(screen[0], -screen[0], width)[columns]
+        y = np.linspace(screen[1], -screen[1], height)[rows]
+        # Their cost is counted in the nearest pixel of the tile
+        traced = (np.clip(rows, top, bottom - 1) - top) * shape[1]
+        traced += np.clip(columns, left, right - 1) - left
+        args = (*screen_rays(scene, zoom, x, y), max_depth, False, stats, traced, shadows)
+        return trace_rays(*functions, *args, generator)
+
+    colors, inside = apron(sums, tile, width, height, trace)
+    sums = sums.reshape(-1, 3)
+    squares = sums**2
+    counts = np.ones(len(sums), dtype=np.int64)
+    pixels = np.flatnonzero(contrast(colors)[inside] > threshold)
+    rounds = -(-(samples - 1) // 4)
+
+    with Progress(auto_refresh=False, disable=not display) as progress:
+        task = progress.add_task("Sampling ...", total=rounds)
+        for _ in range(rounds):
+            if not len(pixels):
+                break
+            rows, columns = np.divmod(np.repeat(pixels, 4), shape[1])
+            offsets = stratified_offsets(len(pixels), generator)
+            x = screen[0] + (left + columns + offsets[:, 0]) * spacing[0]
+            y = screen[1] + (top + rows + offsets[:, 1]) * spacing[1]
+            origin, directions = screen_rays(scene, zoom, x, y)
+            args = (origin, directions, max_depth, False, stats, np.repeat(pixels, 4), shadows)
+            colors = trace_rays(*functions, *args, generator).reshape(-1, 4, 3)
+            sums[pixels] += colors.sum(axis=1)
+            squares[pixels] += (colors**2).sum(axis=1)
+            counts[pixels] += 4
+
+            n = counts[pixels, None]
+            variances = np.maximum(squares[pixels] / n - (sums[pixels] / n) ** 2, 0)
+            errors = np.sqrt(variances / n).max(axis=1)
+            pixels = pixels[errors > threshold]
+            progress.advance(task)
+            progress.refresh()
+    image = (sums / counts[:, None]).reshape(*shape, 3)
+    return image, counts.reshape(shape)
@@ -0,0 +1,93 @@
+from hashlib import sha256
+from pathlib import Path
+from .mesh import Mesh, LEAF_SIZE
+import json, os, shutil, tempfile
+
+# Change it when the layout of cached arrays changes
+VERSION = 2
+CACHE_DIRECTORY = Path.home() / ".cache" / "vtk-raytracing"
+MAX_SIZE = 1 << 30  # bytes
+
+
+def generate_key(objtype, arguments):
+    """
+    Return the key of an item of a configuration, cheap to compute
+    Items with the same key share their mesh (see `Scene`)
+    - the resolved path of the file for "ply"
+    - the parameters for "sphere"
+    - None for items which are not worth sharing nor caching
+    """
+    if objtype == "ply":
+        return (objtype, str(Path(arguments).resolve()))
+    if objtype == "sphere":
+        return (objtype, json.dumps(arguments))
+    return None
+
+
+def content_key(key):
+    """
+    Return the key of an item (see `generate_key`) in a `MeshCache`
+    - the hash of the file for "ply"
+    - the hash of the parameters for "sphere"
+    """
+    objtype, argument = key
+    digest = sha256(f"{VERSION}-{LEAF_SIZE}-{objtype}".encode())
+    if objtype == "ply":
+        with open(argument, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    else:
+        digest.update(argument.encode())
+    return digest.hexdigest()
+
+
+def directory_size(directory):
+    return sum(file.stat().st_size for file in directory.iterdir())
+
+
+class MeshCache:
+    """
+    Content-addressed cache of meshes stored as memory-mappable `.npy` files
+    The least recently used meshes are removed when the cache exceeds `max_size` bytes
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_size=MAX_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def load(self, key):
+        """
+        Return the mesh stored with `key` or None
+        """
+        path = self.directory / key
+        if not path.is_dir():
+            return None
+        os.utime(path)  # most recently used
+        return Mesh.load(path)
+
+    def store(self, key, mesh):
+        """
+        Store the mesh with `key` then evict the least recently used meshes
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+        mesh.save(temporary)
+        try:
+            temporary.rename(self.directory / key)
+        except OSError:  # stored meanwhile by another process
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used meshes until the cache fits in `max_size`
+        """
+        entries = [path for path in self.directory.iterdir() if not path.name.startswith(".")]
+        entries.sort(key=lambda path: path.stat().st_mtime)
+        sizes = [directory_size(path) for path in entries]
+        total = sum(sizes)
+        for path, size in zip(entries, sizes):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
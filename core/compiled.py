@@ -0,0 +1,207 @@
+from math import cos, inf, radians
+from .jit import AVAILABLE
+import glm
+import numpy as np
+
+
+class Materials:
+    """
+    Materials of a scene as float32 arrays indexed by object
+    """
+
+    __slots__ = ("ambient", "diffuse", "specular", "shininess", "reflection")
+
+    def __init__(self, materials):
+        array = lambda values: np.array(values, dtype=np.float32)
+        self.ambient = array([m.ambient for m in materials]).reshape(-1, 3)
+        self.diffuse = array([m.diffuse for m in materials]).reshape(-1, 3)
+        self.specular = array([m.specular for m in materials])
+        self.shininess = array([m.shininess for m in materials])
+        self.reflection = array([m.reflection for m in materials])
+
+
+class RenderLights:
+    """
+    Lights of a scene as arrays indexed by light
+    The ambient light is the ambient color of the first light, it is added once
+    `cones` are the cosines of the cones of spot lights (-inf for point lights)
+    """
+
+    __slots__ = (
+        "positions",
+        "ambient",
+        "diffuse",
+        "specular",
+        "axes",
+        "cones",
+        "attenuations",
+        "reaches",
+    )
+
+    def __init__(self, lights):
+        array = lambda values, dtype: np.array(values, dtype=dtype).reshape(len(lights), -1)
+        self.positions = array([light.position for light in lights], np.float64)
+        self.ambient = np.array(lights[0].ambient, dtype=np.float32)
+        self.diffuse = array([light.diffuse for light in lights], np.float32)
+        self.specular = array([light.specular for light in lights], np.float32)
+        axis = lambda light: (0, 0, 0) if light.axis is None else light.axis
+        self.axes = array([axis(light) for light in lights], np.float64)
+        cosine = lambda light: -inf if light.axis is None else cos(radians(light.cone))
+        self.cones = np.array([cosine(light) for light in lights])
+        self.attenuations = array([light.attenuation for light in lights], np.float64)
+        self.reaches = np.array([light.reach for light in lights])
+
+
+class Shading:
+    """
+    Coefficients of the materials of a scene premultiplied by the colors of its lights,
+    built with the scene (see `Scene.update`) instead of at each intersection
+    `ambient` is indexed by object, `diffuse` and `specular` by object and light,
+    `exponents` are the specular exponents of objects (a quarter of their shininess)
+    """
+
+    __slots__ = ("lights", "ambient", "diffuse", "specular", "exponents", "reflection")
+    __slots__ += ("_coefficients",)
+
+    def __init__(self, materials, lights):
+        """
+        `materials` are the `Materials` of objects and `lights` the `RenderLights`
+        """
+        self.lights = lights
+        self.ambient = materials.ambient * lights.ambient
+        self.diffuse = materials.diffuse[:, None] * lights.diffuse
+        self.specular = materials.specular[:, None, None] * lights.specular
+        self.exponents = materials.shininess * 0.25
+        self.reflection = materials.reflection
+        self._coefficients = None
+
+    @property
+    def coefficients(self):
+        """
+        Return the coefficients of each object as glm vectors for the scalar renderer:
+        ambient color, diffuse and specular colors of each light and specular exponent
+        (see `raytracing.contribute`), converted once on first use
+        """
+        if self._coefficients is None:
+            vectors = lambda colors: [glm.vec3(*color) for color in colors]
+            arrays = (self.ambient, self.diffuse, self.specular, self.exponents)
+            self._coefficients = [
+                (glm.vec3(*ambient), vectors(diffuse), vectors(specular), float(exponent))
+                for ambient, diffuse, specular, exponent in zip(*arrays)
+            ]
+        return self._coefficients
+
+
+class RenderCamera:
+    __slots__ = ("position",)
+
+    def __init__(self, camera):
+        self.position = np.array(camera, dtype=np.float64)
+
+
+class MeshBuffers:
+    """
+    Vertices, vertex normals and triangles of every mesh of a scene in flat buffers
+    The triangle of the cell `c` of the object `i` is `triangles[offsets[i] + c]`
+    (its vertex ids are -1 if the cell is not a triangle)
+    Objects with the same arrays share their block of the buffers
+    Each triangle ABC also stores its corner C and the dual basis of (AC, BC, AC x BC),
+    so that the barycentric coordinates of a point P are `bases[cell] @ (P - C)`
+    """
+
+    __slots__ = ("vertices", "normals", "triangles", "offsets", "corners", "bases")
+
+    def __init__(self, arrays):
+        """
+        `arrays` are the vertices, the vertex normals and the first three point ids
+        of each cell of every object (None for objects without mesh)
+        """
+        vertices, normals, triangles, offsets = [], [], [], []
+        count = cells = 0
+        blocks = {}
+        for item in arrays:
+            if item is None:
+                offsets.append(cells)
+            elif id(item) in blocks:
+                offsets.append(blocks[id(item)])
+            else:
+                blocks[id(item)] = cells
+                offsets.append(cells)
+                object_vertices, object_normals, cell_points = item
+                vertices.append(object_vertices)
+                normals.append(object_normals)
+                cell_points = np.asarray(cell_points)
+                triangles.append(np.where(cell_points == -1, -1, cell_points + count))
+                count += len(object_vertices)
+                cells += len(cell_points)
+        join = lambda arrays, shape, dtype: (
+            np.concatenate(arrays).astype(dtype) if arrays else np.zeros(shape, dtype)
+        )
+        self.vertices = join(vertices, (0, 3), np.float32)
+        self.normals = join(normals, (0, 3), np.float32)
+        self.triangles = join(triangles, (0, 3), np.int32)
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+        A, B, C = (self.vertices[self.triangles[:, k]].astype(np.float64) for k in range(3))
+        AC, BC = A - C, B - C
+        normal = np.cross(AC, BC)
+        determinant = np.einsum("ij,ij->i", normal, normal)
+        invalid = (determinant == 0) | (self.triangles[:, 0] == -1)
+        determinant[invalid] = 1
+        bases = np.stack((np.cross(BC, normal), np.cross(normal, AC)), axis=1)
+        self.bases = bases / determinant[:, None, None]
+        self.bases[invalid] = 0
+        self.corners = C
+
+    def interpolate(self, cells, targets):
+        """
+        Return the vertex normals interpolated at the targets of the flat `cells`
+        """
+        u, v = np.einsum("nij,nj->in", self.bases[cells], targets - self.corners[cells])
+        n0, n1, n2 = np.moveaxis(self.normals[self.triangles[cells]], 1, 0)
+        return u[:, None] * n0 + v[:, None] * n1 + (1 - u - v)[:, None] * n2
+
+    def interpolate_cell(self, cell, target):
+        """
+        Scalar version of `interpolate` for one flat cell, faster with Python floats
+        """
+        (b0, b1), corner = self.bases[cell].tolist(), self.corners[cell].tolist()
+        n0, n1, n2 = self.normals[self.triangles[cell]].tolist()
+        d = [t - c for t, c in zip(target, corner)]
+        u = b0[0] * d[0] + b0[1] * d[1] + b0[2] * d[2]
+        v = b1[0] * d[0] + b1[1] * d[1] + b1[2] * d[2]
+        w = 1 - u - v
+        return [u * a + v * b + w * c for a, b, c in zip(n0, n1, n2)]
+
+
+class RenderScene:
+    """
+    Compact form of a `Scene` read by the wavefront renderer
+    Shading coefficients are a struct of arrays and the meshes are flat buffers, so that
+    hot loops index arrays instead of reading attributes of Python objects
+    With `primitives`, the normals of primitives are exact and their meshes are not built
+    With `kernels`, normals and colors are computed by compiled kernels (see `core.jit`)
+    """
+
+    __slots__ = (
+        "objects",
+        "hierarchy",
+        "shading",
+        "lights",
+        "camera",
+        "buffers",
+        "exact",
+        "kernels",
+    )
+
+    def __init__(self, scene, primitives=False, kernels=False):
+        self.objects = scene.objects
+        self.hierarchy = scene.hierarchy
+        self.shading = scene.shading
+        self.lights = scene.shading.lights
+        self.camera = RenderCamera(scene.camera)
+        self.exact = np.array(
+            [primitives and obj.data.primitive is not None for obj in scene.objects], dtype=bool
+        )
+        self.buffers = scene.buffers(primitives)
+        self.kernels = kernels and AVAILABLE
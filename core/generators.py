@@ -1,6 +1,9 @@
 from collections import namedtuple
 from itertools import starmap, repeat
 from math import acos
+from .objects import Scene
+from .cache import generate_key
+from .ply import load_ply, to_polydata
 
 import vtk
 import glm
@@ -24,18 +27,8 @@ PLANE_TRANSLATIONS = [
 ]
 
 
-Object = namedtuple("Object", ["item", "obbtree", "material", "position"])
-
-
-def _generate_obbtree(obj, getoutput):
-    """
-    Return a `vtkObbtree` given the object
-    For convenience, `getoutput` is used depending of the input `obj`
-    """
-    ot = vtk.vtkOBBTree()
-    ot.SetDataSet(obj.GetOutput() if getoutput else obj)
-    ot.BuildLocator()
-    return ot
+# `key` identifies the geometry (see `cache.generate_key`), None if not shared nor cached
+Object = namedtuple("Object", ["item", "key", "material", "position"])
 
 
 def _generate_sphere(phi, theta, center, radius):
@@ -56,11 +49,17 @@ def _generate_sphere(phi, theta, center, radius):
 def _generate_obj_ply(filename):
     """
     Return a object which can be manipulate with VTK
+    Binary files are memory-mapped (see `core.ply`), others are read by `vtkPLYReader`
     """
-    reader = vtk.vtkPLYReader()
-    reader.SetFileName(filename)
-    reader.Update()
-    return reader
+    ply = load_ply(filename)
+    if ply is None:
+        reader = vtk.vtkPLYReader()
+        reader.SetFileName(filename)
+        reader.Update()
+        return reader
+    producer = vtk.vtkTrivialProducer()
+    producer.SetOutput(to_polydata(ply))
+    return producer
 
 
 def _generate_plane(width, z, normal, translation):
@@ -139,19 +138,18 @@ def generate_data(objects, labels=None):
         objtype, arguments = description["item"]
         material = [convert2vec3(data) for data in description["material"]]
         position = description["position"]
+        key = generate_key(objtype, arguments)
         if objtype == "sphere":
             mapper = vtk.vtkPolyDataMapper()
             obj = _generate_sphere(*arguments)
-            obbtree = _generate_obbtree(obj, True)
-            result = Object(obj, obbtree, material, position)
+            result = Object(obj, key, material, position)
             processed_objects.append(result)
             mapper.SetInputConnection(obj.GetOutputPort())
             actors.append(_generate_actor(mapper, material, position))
         elif objtype == "ply":
             mapper = vtk.vtkPolyDataMapper()
             obj = _generate_obj_ply(arguments)
-            obbtree = _generate_obbtree(obj, True)
-            result = Object(obj, obbtree, material, position)
+            result = Object(obj, key, material, position)
             processed_objects.append(result)
             mapper.SetInputConnection(obj.GetOutputPort())
             actors.append(_generate_actor(mapper, material, position))
@@ -160,8 +158,7 @@ def generate_data(objects, labels=None):
             translations = [PLANE_TRANSLATIONS[i] for i in arguments]
             params = zip(repeat(100), repeat(-20), normals, translations)
             objs = list(starmap(_generate_plane, params))
-            obbtrees = [_generate_obbtree(obj, False) for obj in objs]
-            result = [Object(obj, ot, material, position) for obj, ot in zip(objs, obbtrees)]
+            result = [Object(obj, key, material, position) for obj in objs]
             processed_objects.extend(result)
             for obj in objs:
                 mapper = vtk.vtkPolyDataMapper()
@@ -172,8 +169,7 @@ def generate_data(objects, labels=None):
             normal = PLANE_NORMALS[0]
             translation = PLANE_TRANSLATIONS[0]
             obj = _generate_plane(100, arguments[0], normal, translation)
-            obbtree = _generate_obbtree(obj, False)
-            processed_objects.append(Object(obj, obbtree, material, position))
+            processed_objects.append(Object(obj, key, material, position))
             mapper = vtk.vtkPolyDataMapper()
             mapper.SetInputData(obj)
             actors.append(_generate_actor(mapper, material, position))
@@ -186,6 +182,50 @@ def generate_data(objects, labels=None):
         planes_labels = [f"Plane {i}" for i in range(length_planes)]
         processed_labels = labels[:index] + planes_labels + labels[index + 1 :]
     else:
-        processed_labels = [f"Object {i}" for i in range(processed_objects)]
+        processed_labels = [f"Object {i}" for i in range(len(processed_objects))]
 
     return processed_objects, processed_labels, actors
+
+
+def generate_lights(configuration, target):
+    """
+    Return the `vtkLight`s of a configuration
+    - `"light"` is a single light `[position, angle]`, a point light
+    - `"lights"` is a list of lights `[position, angle, intensity, attenuation]` (intensity
+      and attenuation `[constant, linear, quadratic]` are optional), positional lights which
+      are spot lights focused on `target` (an actor) if their angle is under 90 degrees
+    """
+    lights = []
+    if "light" in configuration:
+        position, angle = configuration["light"]
+        light = vtk.vtkLight()
+        light.SetPosition(position)
+        light.SetConeAngle(angle)
+        lights.append(light)
+    for position, angle, *options in configuration.get("lights", []):
+        defaults = [1, (1, 0, 0)]
+        intensity, attenuation = options + defaults[len(options) :]
+        light = vtk.vtkLight()
+        light.SetPosition(position)
+        light.SetConeAngle(angle)
+        light.SetFocalPoint(target.GetPosition())
+        light.SetIntensity(intensity)
+        light.SetAttenuationValues(*attenuation)
+        light.PositionalOn()
+        lights.append(light)
+    if not lights:
+        raise Exception('"light" or "lights" is missing in the configuration')
+    return lights
+
+
+def generate_scene(configuration, display=False, cache=None):
+    """
+    Return a `Scene` given a configuration, without any render window
+    `cache` is an optional `MeshCache`
+    """
+    zoom = configuration["scene"][2]
+    objects, _, actors = generate_data(configuration["objects"], configuration.get("labels"))
+    camera = vtk.vtkCamera()
+    camera.SetPosition(glm.vec3(configuration["camera"]) * zoom * 5)  # offset = 5
+    lights = generate_lights(configuration, actors[configuration.get("target", 0)])
+    return Scene(objects, actors, lights, camera, display, cache)
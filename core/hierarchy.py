@@ -0,0 +1,63 @@
+from .mesh import build_bvh, intersect_boxes
+import numpy as np
+
+
+def pad(lower, upper):
+    """
+    Return the bounds padded so that flat objects (planes) and rounding errors do not lose hits
+    """
+    lower = np.asarray(lower, dtype=np.float64).reshape(-1, 3)
+    upper = np.asarray(upper, dtype=np.float64).reshape(-1, 3)
+    padding = 1e-6 * (1 + np.maximum(np.abs(lower), np.abs(upper)))
+    return lower - padding, upper + padding
+
+
+class ObjectHierarchy:
+    """
+    BVH over the bounding boxes of the objects of a scene
+    """
+
+    def __init__(self, lower, upper):
+        self.lower, self.upper = pad(lower, upper)
+        self.bvh, self.order = build_bvh(self.lower, self.upper, leaf_size=1)
+
+    def candidates(self, origins, directions, distances):
+        """
+        Yield the index of objects with the rays which may hit them closer than `distances`
+        Nearest boxes are yielded first and `distances` are read at each step, therefore
+        the caller shrinks them in place as hits are found to skip farther objects
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        with np.errstate(divide="ignore"):
+            inverses = 1 / directions
+
+        lower, upper, children, start, count = self.bvh
+        rays = np.arange(len(origins))
+        near, far = intersect_boxes(lower[0], upper[0], origins, inverses)
+        hit = (near <= far) & (far >= 0)
+        stack = [(0, rays[hit], near[hit])]
+        while stack:
+            node, rays, near = stack.pop()
+            if children[node] == -1:
+                for index in self.order[start[node] : start[node] + count[node]]:
+                    kept = near < distances[rays]
+                    rays, near = rays[kept], near[kept]
+                    if not rays.size:
+                        break
+                    yield index, rays
+                continue
+            kept = near < distances[rays]
+            rays = rays[kept]
+            if not rays.size:
+                continue
+            # Push the farthest child first so that the nearest one is popped first
+            pushed = []
+            ray_origins, ray_inverses = origins[rays], inverses[rays]
+            for child in (children[node], children[node] + 1):
+                near, far = intersect_boxes(lower[child], upper[child], ray_origins, ray_inverses)
+                hit = (near <= far) & (far >= 0) & (near < distances[rays])
+                if hit.any():
+                    pushed.append((near[hit].min(), child, rays[hit], near[hit]))
+            for _, child, child_rays, child_near in sorted(pushed, key=lambda item: -item[0]):
+                stack.append((child, child_rays, child_near))
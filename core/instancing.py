@@ -0,0 +1,112 @@
+from math import inf
+import numpy as np
+
+
+class Transform:
+    """
+    Affine transform from the local space of an object (where its data and trees are built)
+    to the world
+    Rays are moved into the local space instead of moving the data, so that moving an object
+    costs nothing and instances of the same data share their trees
+    """
+
+    __slots__ = ("matrix", "inverse", "normal_matrix")
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.inverse = np.linalg.inv(self.matrix)
+        self.normal_matrix = self.inverse[:3, :3].T
+
+    @classmethod
+    def from_actor(cls, actor, baked=(0, 0, 0)):
+        """
+        Return the transform of an actor whose data is already translated by `baked`
+        (None if the transform is the identity)
+        """
+        vtkmatrix = actor.GetMatrix()
+        matrix = np.array([[vtkmatrix.GetElement(i, j) for j in range(4)] for i in range(4)])
+        matrix[:3, 3] -= matrix[:3, :3] @ np.asarray(baked, dtype=np.float64)
+        if np.array_equal(matrix, np.identity(4)):
+            return None
+        return cls(matrix)
+
+    def rays_to_local(self, origins, directions):
+        """
+        Return the rays in the local space
+        Directions are not normalized so that distances along rays are the same in both spaces
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        rotation = self.inverse[:3, :3]
+        return origins @ rotation.T + self.inverse[:3, 3], directions @ rotation.T
+
+    def points_to_local(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        return points @ self.inverse[:3, :3].T + self.inverse[:3, 3]
+
+    def points_to_world(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        return points @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+
+    def normals_to_world(self, normals):
+        """
+        Return the normals in the world (not normalized)
+        """
+        return np.asarray(normals, dtype=np.float64).reshape(-1, 3) @ self.normal_matrix.T
+
+    def bounds(self, lower, upper):
+        """
+        Return the world bounding box of a local bounding box
+        """
+        corners = np.array(np.meshgrid(*zip(lower, upper), indexing="ij")).reshape(3, -1).T
+        corners = self.points_to_world(corners)
+        return corners.min(axis=0), corners.max(axis=0)
+
+
+def object_bounds(obj):
+    """
+    Return the lower and upper corners of the bounding box of an object in the world
+    """
+    if obj.transform is None:
+        return obj.data.bounds
+    return obj.transform.bounds(*obj.data.bounds)
+
+
+def instanced(function):
+    """
+    Return the intersection function `function(data, origins, directions, distances)`
+    of a backend applied to an object with a transform
+    The intersected points and their distances are given in the world
+    """
+
+    def intersect(obj, origins, directions, distances=inf):
+        transform = obj.transform
+        if transform is None:
+            return function(obj.data, origins, directions, distances)
+        local_origins, local_directions = transform.rays_to_local(origins, directions)
+        args = (local_origins, local_directions, distances)
+        distances, cellIds, points = function(obj.data, *args)
+        hit = cellIds != -1
+        points = transform.points_to_world(points)
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        points[~hit] = origins[~hit]
+        # VTK gives distances in the local space
+        distances[hit] = np.linalg.norm(points[hit] - origins[hit], axis=1)
+        return distances, cellIds, points
+
+    return intersect
+
+
+def instanced_occlusion(function):
+    """
+    Return the occlusion function `function(data, origins, directions, distances)`
+    of a backend applied to an object with a transform
+    """
+
+    def occlude(obj, origins, directions, distances):
+        transform = obj.transform
+        if transform is None:
+            return function(obj.data, origins, directions, distances)
+        return function(obj.data, *transform.rays_to_local(origins, directions), distances)
+
+    return occlude
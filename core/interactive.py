@@ -0,0 +1,221 @@
+from .hierarchy import pad
+from .instancing import object_bounds
+from .lights import attenuate, illuminate, reaching_lights
+from .mesh import intersect_boxes
+from .progressive import STRIDE, interleaved_offsets, fill
+from .raytracing import BACKENDS, OCCLUSIONS, PRIMITIVES
+from .wavefront import (
+    nearest_intersected_objects,
+    normalize,
+    occluding_objects,
+    primary_rays,
+    reflected,
+    surface_normals,
+)
+import numpy as np
+
+
+class RenderCache:
+    """
+    Keep the paths of the rays of the last rendering (a G-buffer of every bounce) to render
+    again only what changed:
+    - when the intensity of lights or materials change, paths are shaded again without tracing
+      (shadow rays are traced at any distance, lights are culled by their reach when shading)
+    - when lights move, only shadow rays are traced again (towards every light)
+    - when objects move, only pixels whose rays crossed their old or new bounds are traced again
+    Any other change (camera, size, depth, objects) traces the whole frame
+    Paths are traced up to `max_depth` even behind a shadowed bounce to be shaded again later
+    """
+
+    def __init__(self, backend="analytic"):
+        self.backend = backend
+        self.frame = None  # camera, width, height, zoom, max_depth, numbers of objects and lights
+        self.lights = None  # positions and cones of the lights of the shadow rays
+        self.objects = None  # position, orientation and bounds of objects
+
+    def generate(self, scene, max_depth=3, width=300, height=200, zoom=20, stride=STRIDE):
+        """
+        Yield the image (or its preview) and the rendered fraction
+        The whole frame is traced progressively (see `core.progressive`), otherwise
+        only the final image is yielded
+        """
+        frame = (tuple(scene.camera), width, height, zoom, max_depth, len(scene.objects))
+        frame += (len(scene.lights),)
+        objects = [self.describe(obj) for obj in scene.objects]
+        lights = [self.describe_light(light) for light in scene.lights]
+        if frame != self.frame:
+            self.frame = None  # invalid until the whole frame is traced
+            self.allocate(scene, max_depth, width, height, zoom)
+            preview = np.zeros((height, width, 3))
+            offsets = interleaved_offsets(stride)
+            for index, ((row, column), size) in enumerate(offsets):
+                rows, columns = np.arange(row, height, stride), np.arange(column, width, stride)
+                pixels = (rows[:, None] * width + columns).ravel()
+                self.trace(scene, pixels)
+                self.shadow(scene, pixels)
+                colors = self.shade(scene, pixels).reshape(len(rows), len(columns), 3)
+                fill(preview, colors, row, column, size, stride)
+                if index + 1 < len(offsets):
+                    yield preview, (index + 1) / len(offsets)
+            self.frame, self.lights, self.objects = frame, lights, objects
+            yield preview, 1.0
+            return
+
+        moved = [i for i, (old, new) in enumerate(zip(self.objects, objects)) if old != new]
+        boxes = [box for i in moved for box in (self.objects[i][2:], objects[i][2:])]
+        dirty = self.crossing(boxes)
+        self.trace(scene, dirty)
+        if lights != self.lights:
+            self.shadow(scene, np.arange(width * height))
+        elif boxes:
+            self.shadow(scene, np.union1d(dirty, self.shadows_crossing(scene, boxes)))
+        self.lights, self.objects = lights, objects
+        yield self.shade(scene).reshape(height, width, 3), 1.0
+
+    @staticmethod
+    def describe(obj):
+        lower, upper = object_bounds(obj)
+        return (tuple(obj.position), tuple(obj.orientation), tuple(lower), tuple(upper))
+
+    @staticmethod
+    def describe_light(light):
+        axis = None if light.axis is None else tuple(light.axis)
+        return (tuple(light.position), axis, light.cone)
+
+    def allocate(self, scene, max_depth, width, height, zoom):
+        """
+        Allocate the buffers of `max_depth` bounces of every pixel
+        Rays which are not cast have a `nan` distance, missed rays an infinite one
+        """
+        shape = (max_depth, width * height)
+        self.origin, self.primary = primary_rays(scene, width, height, zoom, (0, height, 0, width))
+        self.indexes = np.full(shape, -1)
+        self.distances = np.full(shape, np.nan)
+        self.origins = np.zeros((*shape, 3))
+        self.directions = np.zeros((*shape, 3))
+        self.intersections = np.zeros((*shape, 3))
+        self.normals = np.zeros((*shape, 3))
+        self.visible = np.zeros((*shape, len(scene.lights)), dtype=bool)
+
+    def trace(self, scene, pixels):
+        """
+        Trace again every bounce of the rays of `pixels` (flat indexes)
+        """
+        intersect = BACKENDS[self.backend]
+        render = scene.compile(self.backend in PRIMITIVES, self.backend == "jit")
+        self.indexes[:, pixels] = -1
+        self.distances[:, pixels] = np.nan
+        origins = np.tile(self.origin, (len(pixels), 1))
+        directions = self.primary[pixels]
+        for depth in range(len(self.indexes)):
+            if not len(pixels):
+                break
+            args = (scene.objects, intersect, origins, directions)
+            result = nearest_intersected_objects(*args, hierarchy=scene.hierarchy)
+            indexes, distances, subIds, targets = result
+            self.origins[depth, pixels] = origins
+            self.directions[depth, pixels] = directions
+            self.distances[depth, pixels] = distances
+
+            alive = indexes != -1
+            pixels, origins, directions = pixels[alive], origins[alive], directions[alive]
+            indexes, distances = indexes[alive], distances[alive]
+            subIds, targets = subIds[alive], targets[alive]
+            intersections = origins + distances[:, None] * directions
+            n2s = surface_normals(render, indexes, subIds, targets)
+            self.indexes[depth, pixels] = indexes
+            self.intersections[depth, pixels] = intersections
+            self.normals[depth, pixels] = n2s
+
+            origins = intersections + 1e-5 * n2s
+            directions = reflected(directions, n2s)
+
+    def shadow(self, scene, pixels):
+        """
+        Trace again the shadow rays of every bounce of `pixels` (flat indexes) towards
+        the lights whose cone contains them (see `lights.reaching_lights`), at any distance
+        so that a change of the reach of a light does not trace them again
+        """
+        occlude = OCCLUSIONS[self.backend]
+        lights = scene.shading.lights
+        depths, columns = np.nonzero(self.indexes[:, pixels] != -1)
+        pixels = pixels[columns]
+        intersections = self.intersections[depths, pixels]
+        shifted_points = intersections + 1e-5 * self.normals[depths, pixels]
+        owners, sources, i2l_distances = reaching_lights(lights, intersections, reaches=False)
+        i2l = normalize(lights.positions[sources] - shifted_points[owners])
+        order = np.arange(len(scene.objects))
+        args = (scene.objects, occlude, shifted_points[owners], i2l, i2l_distances, order)
+        occluders = occluding_objects(*args, hierarchy=scene.hierarchy)
+        self.visible[depths, pixels] = False
+        self.visible[depths[owners], pixels[owners], sources] = occluders == -1
+
+    def shade(self, scene, pixels=None):
+        """
+        Return the colors of `pixels` (flat indexes, every pixel by default) from their paths
+        A path stops at its first bounce seen by no light within its reach
+        """
+        pixels = np.arange(self.indexes.shape[1]) if pixels is None else pixels
+        render = scene.compile(self.backend in PRIMITIVES, self.backend == "jit")
+        lights, camera = render.lights, render.camera.position
+        colors = np.zeros((len(pixels), 3))
+        reflections = np.ones(len(pixels))
+        rays = np.arange(len(pixels))
+        for depth in range(len(self.indexes)):
+            rays = rays[self.indexes[depth, pixels[rays]] != -1]
+            paths = pixels[rays]
+            intersections = self.intersections[depth, paths]
+            owners, sources = np.nonzero(self.visible[depth, paths])
+            distances = np.linalg.norm(lights.positions[sources] - intersections[owners], axis=1)
+            kept = distances <= lights.reaches[sources]
+            owners, sources, distances = owners[kept], sources[kept], distances[kept]
+            lit = np.zeros(len(rays), dtype=bool)
+            lit[owners] = True
+            owners = (np.cumsum(lit) - 1)[owners]
+            rays, paths, intersections = rays[lit], paths[lit], intersections[lit]
+            if not rays.size:
+                break
+            n2s = self.normals[depth, paths]
+            positions = lights.positions[sources]
+            i2l = normalize(positions - (intersections + 1e-5 * n2s)[owners])
+            factors = attenuate(lights, sources, distances)
+            i2c = normalize(camera - intersections)
+            objects = self.indexes[depth, paths]
+            args = (i2c, n2s, owners, sources, i2l, factors)
+            illumination = illuminate(render.shading, objects, *args)
+            colors[rays] += reflections[rays, None] * illumination
+            reflections[rays] *= render.shading.reflection[objects]
+        return np.clip(colors, 0, 1)
+
+    def crossing(self, boxes):
+        """
+        Return the pixels (flat indexes) of which a ray crosses one of the boxes before its hit
+        """
+        depths, pixels = np.nonzero(~np.isnan(self.distances))
+        origins = self.origins[depths, pixels]
+        with np.errstate(divide="ignore"):
+            inverses = 1 / self.directions[depths, pixels]
+        return self.crossed(boxes, pixels, origins, inverses, self.distances[depths, pixels])
+
+    def shadows_crossing(self, scene, boxes):
+        """
+        Return the pixels (flat indexes) of which a shadow ray crosses one of the boxes
+        """
+        lights = scene.shading.lights
+        depths, pixels = np.nonzero(self.indexes != -1)
+        intersections = self.intersections[depths, pixels]
+        shifted_points = intersections + 1e-5 * self.normals[depths, pixels]
+        owners, sources, distances = reaching_lights(lights, intersections, reaches=False)
+        shifted_points = shifted_points[owners]
+        with np.errstate(divide="ignore"):
+            inverses = 1 / normalize(lights.positions[sources] - shifted_points)
+        return self.crossed(boxes, pixels[owners], shifted_points, inverses, distances)
+
+    @staticmethod
+    def crossed(boxes, pixels, origins, inverses, distances):
+        crossed = np.zeros(len(pixels), dtype=bool)
+        for lower, upper in boxes:
+            lower, upper = pad(lower, upper)
+            near, far = intersect_boxes(lower[0], upper[0], origins, inverses)
+            crossed |= (near <= far) & (far >= 0) & (near <= distances)
+        return np.unique(pixels[crossed])
@@ -0,0 +1,232 @@
+from math import inf
+from time import perf_counter
+from .mesh import build_bvh
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional dependency, `jit` backend falls back to numpy
+    numba = None
+
+AVAILABLE = numba is not None
+EPSILON = 1e-8  # same as `mesh.EPSILON`
+STACK_SIZE = 64  # deeper than any BVH built with median splits
+
+
+def jit(function):
+    """
+    Compile a kernel on its first call, the machine code is cached on the disk
+    (next to the module or in `NUMBA_CACHE_DIR`) so that next runs only load it
+    Division by zero follows numpy (infinite inverses of directions)
+    """
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True, error_model="numpy")(function)
+
+
+@jit
+def _traverse(bvh, origins, edges1, edges2, origin, direction, max_distance, any_hit):
+    """
+    Return the distance and the index of the nearest triangle of the BVH hit by a ray
+    closer than `max_distance` (`max_distance` and -1 if missed)
+    With `any_hit`, the first triangle found closer is returned
+    """
+    lower, upper, children, start, count = bvh
+    inverse = 1 / direction
+    stack = np.empty(STACK_SIZE, np.int64)
+    stack[0] = 0
+    size = 1
+    best, hit = max_distance, -1
+    while size:
+        size -= 1
+        node = stack[size]
+        # Slabs test, NaN (origin on a slab of a parallel ray) does not bound the interval
+        near, far = -inf, inf
+        for k in range(3):
+            t1 = (lower[node, k] - origin[k]) * inverse[k]
+            t2 = (upper[node, k] - origin[k]) * inverse[k]
+            low = t2 if t1 != t1 or t2 < t1 else t1
+            high = t2 if t1 != t1 or t2 > t1 else t1
+            if low == low and low > near:
+                near = low
+            if high == high and high < far:
+                far = high
+        if not (near <= far and far >= 0 and near < best):
+            continue
+        if children[node] != -1:
+            stack[size] = children[node]
+            stack[size + 1] = children[node] + 1
+            size += 2
+            continue
+        for i in range(start[node], start[node] + count[node]):
+            # Möller–Trumbore, see `mesh.intersect_triangles`
+            e1, e2 = edges1[i], edges2[i]
+            p0 = direction[1] * e2[2] - direction[2] * e2[1]
+            p1 = direction[2] * e2[0] - direction[0] * e2[2]
+            p2 = direction[0] * e2[1] - direction[1] * e2[0]
+            det = e1[0] * p0 + e1[1] * p1 + e1[2] * p2
+            if abs(det) <= EPSILON:
+                continue
+            inv_det = 1 / det
+            s0 = origin[0] - origins[i, 0]
+            s1 = origin[1] - origins[i, 1]
+            s2 = origin[2] - origins[i, 2]
+            u = (s0 * p0 + s1 * p1 + s2 * p2) * inv_det
+            q0 = s1 * e1[2] - s2 * e1[1]
+            q1 = s2 * e1[0] - s0 * e1[2]
+            q2 = s0 * e1[1] - s1 * e1[0]
+            v = (direction[0] * q0 + direction[1] * q1 + direction[2] * q2) * inv_det
+            t = (e2[0] * q0 + e2[1] * q1 + e2[2] * q2) * inv_det
+            if u >= 0 and v >= 0 and u + v <= 1 and t > EPSILON and t < best:
+                best, hit = t, i
+                if any_hit:
+                    return best, hit
+    return best, hit
+
+
+@jit
+def _intersect(bvh, origins, edges1, edges2, rays, directions, max_distances, any_hit):
+    distances = np.empty(len(rays))
+    hits = np.empty(len(rays), np.int64)
+    for r in range(len(rays)):
+        args = (rays[r], directions[r], max_distances[r], any_hit)
+        distances[r], hits[r] = _traverse(bvh, origins, edges1, edges2, *args)
+    return distances, hits
+
+
+@jit
+def _illuminate(ambient, diffuse, specular, exponents, i2c, n2s, owners, i2l, factors):
+    """
+    Blinn-Phong, see `lights.illuminate`
+    `ambient` has one row per point, `diffuse`, `specular` and `exponents` one per pair
+    (premultiplied by the colors of its light, see `Shading`)
+    """
+    illumination = np.empty((len(n2s), 3))
+    for r in range(len(n2s)):
+        for c in range(3):
+            illumination[r, c] = ambient[r, c]
+    for p in range(len(owners)):
+        r = owners[p]
+        cosine = i2l[p, 0] * n2s[r, 0] + i2l[p, 1] * n2s[r, 1] + i2l[p, 2] * n2s[r, 2]
+        h0, h1, h2 = i2l[p, 0] + i2c[r, 0], i2l[p, 1] + i2c[r, 1], i2l[p, 2] + i2c[r, 2]
+        norm = np.sqrt(h0 * h0 + h1 * h1 + h2 * h2)
+        k = (n2s[r, 0] * h0 + n2s[r, 1] * h1 + n2s[r, 2] * h2) / norm
+        k = k ** exponents[p] * factors[p]
+        for c in range(3):
+            illumination[r, c] += diffuse[p, c] * (cosine * factors[p])
+            illumination[r, c] += specular[p, c] * k
+    return illumination
+
+
+@jit
+def _interpolate(bases, corners, normals, triangles, cells, targets):
+    """
+    See `compiled.MeshBuffers.interpolate`
+    """
+    n2s = np.empty((len(cells), 3))
+    for r in range(len(cells)):
+        cell = cells[r]
+        d0 = targets[r, 0] - corners[cell, 0]
+        d1 = targets[r, 1] - corners[cell, 1]
+        d2 = targets[r, 2] - corners[cell, 2]
+        u = bases[cell, 0, 0] * d0 + bases[cell, 0, 1] * d1 + bases[cell, 0, 2] * d2
+        v = bases[cell, 1, 0] * d0 + bases[cell, 1, 1] * d1 + bases[cell, 1, 2] * d2
+        a, b, c = triangles[cell]
+        for k in range(3):
+            w = normals[a, k] * u + normals[b, k] * v
+            n2s[r, k] = w + normals[c, k] * (1 - u - v)
+    return n2s
+
+
+def _rays(origins, directions, distances):
+    origins = np.ascontiguousarray(origins, dtype=np.float64).reshape(-1, 3)
+    directions = np.ascontiguousarray(directions, dtype=np.float64).reshape(-1, 3)
+    distances = np.ascontiguousarray(np.broadcast_to(distances, len(origins)), dtype=np.float64)
+    return origins, directions, distances
+
+
+class CompiledMesh:
+    """
+    `Mesh` whose BVH is traversed by compiled kernels (its numpy methods without Numba)
+    """
+
+    __slots__ = ("mesh",)
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def _intersect(self, origins, directions, max_distances, any_hit):
+        mesh = self.mesh
+        triangles = (tuple(mesh.bvh), mesh.origins, mesh.edges1, mesh.edges2)
+        return _intersect(*triangles, *_rays(origins, directions, max_distances), any_hit)
+
+    def intersect(self, origins, directions, max_distance=inf):
+        """
+        Compiled version of `Mesh.intersect`
+        """
+        if numba is None:
+            return self.mesh.intersect(origins, directions, max_distance)
+        distances, hits = self._intersect(origins, directions, max_distance, False)
+        distances[hits == -1] = inf
+        return distances, hits
+
+    def occluded(self, origins, directions, max_distances):
+        """
+        Compiled version of `Mesh.occluded`
+        """
+        if numba is None:
+            return self.mesh.occluded(origins, directions, max_distances)
+        return self._intersect(origins, directions, max_distances, True)[1] != -1
+
+    def find_intersections(self, origins, directions, max_distance=inf):
+        """
+        Compiled version of `Mesh.find_intersections`
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        distances, hits = self.intersect(origins, directions, max_distance)
+        cells = np.where(hits != -1, self.mesh.cells[hits], -1)
+        points = origins + np.where(hits != -1, distances, 0)[:, None] * directions
+        return distances, cells, points
+
+
+def illuminate(shading, objects, i2c, n2s, owners, sources, i2l, factors):
+    """
+    Compiled version of `lights.illuminate`
+    """
+    pairs = objects[owners]
+    colors = (shading.diffuse[pairs, sources], shading.specular[pairs, sources])
+    args = (shading.exponents[pairs], i2c, n2s, np.asarray(owners, np.int64), i2l)
+    return _illuminate(shading.ambient[objects], *colors, *args, np.asarray(factors, np.float64))
+
+
+def interpolate(buffers, cells, targets):
+    """
+    Compiled version of `MeshBuffers.interpolate`
+    """
+    arrays = (buffers.bases, buffers.corners, buffers.normals, buffers.triangles)
+    return _interpolate(*arrays, np.asarray(cells, dtype=np.int64), targets)
+
+
+def warm_up():
+    """
+    Compile (or load from the disk) every kernel on one triangle and return the time spent
+    Called before renderings, so that compiling is not counted in their time
+    """
+    start = perf_counter()
+    if numba is None:
+        return 0.0
+    corners = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    bvh, _ = build_bvh(corners.min(axis=0)[None], corners.max(axis=0)[None])
+    triangle = (corners[None, 0], corners[None, 1] - corners[0], corners[None, 2] - corners[0])
+    rays = (np.array([[0.2, 0.2, 1.0]]), np.array([[0.0, 0.0, -1.0]]), np.array([inf]))
+    for any_hit in (False, True):
+        _intersect(tuple(bvh), *triangle, *rays, any_hit)
+
+    vectors = np.array([[0.0, 0.0, 1.0]])
+    colors, exponents = np.ones((1, 3), np.float32), np.ones(1, np.float32)
+    owners = np.zeros(1, np.int64)
+    _illuminate(colors, colors, colors, exponents, vectors, vectors, owners, vectors, np.ones(1))
+    bases, triangles, cells = np.zeros((1, 2, 3)), np.zeros((1, 3), np.int32), np.zeros(1, int)
+    _interpolate(bases, vectors, colors, triangles, cells, vectors)
+    return perf_counter() - start
@@ -0,0 +1,302 @@
+from collections import namedtuple
+from matplotlib import pyplot as plt
+from pathlib import Path
+from .generators import generate_scene
+from .options import scene_parameters
+from .parallel import TILE_SIZE, generate_tiles
+from .raytracing import generate_image
+from .streaming import convert, open_image
+import json, os, socket, sqlite3, time
+import numpy as np
+
+MAX_ATTEMPTS = 3  # attempts of a job before it fails
+TIMEOUT = 600  # seconds without checkpoint after which a running job is taken over
+WINDOW = 600  # seconds of checkpoints used to measure the throughput
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    config TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    max_depth INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    rendered INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job INTEGER NOT NULL REFERENCES jobs (id),
+    time REAL NOT NULL,
+    pixels INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoints_time ON checkpoints (time);
+"""
+
+# Row of the `jobs` table
+Job = namedtuple(
+    "Job",
+    ["id", "config", "width", "height", "max_depth", "output", "options", "status", "attempts"]
+    + ["worker", "heartbeat", "rendered", "error", "created", "finished"],
+)
+COLUMNS = ", ".join(Job._fields)
+
+
+class JobQueue:
+    """
+    Queue of render jobs in a SQLite database shared by worker processes
+    A job is "queued", "running", "done" or "failed" (after `MAX_ATTEMPTS` attempts)
+    Running jobs record a checkpoint after each tile, a job without checkpoint for
+    `TIMEOUT` seconds (its worker crashed) is claimed again and resumes from its tiles
+    A worker only updates the jobs it holds: a job claimed again by another worker is
+    lost by its previous worker, whose updates are ignored
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, config, width, height, max_depth, output, options):
+        """
+        Queue a job and return its id and its output
+        `output` is the PNG file of the image, `options` the options of `generate_image`
+        The id of the job is added to the name of the output, so that jobs of the same
+        configuration do not write the same image (and the same checkpoint)
+        """
+        row = (str(config), width, height, max_depth, str(output), json.dumps(options))
+        with self.transaction():
+            cursor = self.connection.execute(
+                "INSERT INTO jobs (config, width, height, max_depth, output, options, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*row, time.time()),
+            )
+            job = cursor.lastrowid
+            output = Path(output)
+            output = output.with_name(f"{output.stem}-{job}{output.suffix}")
+            self.connection.execute("UPDATE jobs SET output = ? WHERE id = ?", (str(output), job))
+        return job, output
+
+    def claim(self, worker):
+        """
+        Return the next job to render (None if there is none) and mark it as running
+        by `worker`, jobs whose worker stopped sending checkpoints are claimed again
+        """
+        now = time.time()
+        with self.transaction():
+            # Jobs of crashed workers which ran out of attempts fail
+            self.connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker stopped'"
+                " WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (now - TIMEOUT, MAX_ATTEMPTS),
+            )
+            row = self.connection.execute(
+                f"SELECT {COLUMNS} FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)"
+                " ORDER BY id LIMIT 1",
+                (now - TIMEOUT,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                (worker, now, row[0]),
+            )
+        job = Job(*row)
+        return job._replace(
+            status="running", attempts=job.attempts + 1, worker=worker, heartbeat=now
+        )
+
+    def checkpoint(self, job, worker, pixels, rendered):
+        """
+        Record that `pixels` more pixels of a job are on the disk (`rendered` in total)
+        Return False if `worker` does not hold the job anymore (nothing is recorded)
+        Checkpoints older than `WINDOW` are removed
+        """
+        now = time.time()
+        with self.transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET heartbeat = ?, rendered = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (now, rendered, job, worker),
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.connection.execute("DELETE FROM checkpoints WHERE time < ?", (now - WINDOW,))
+            self.connection.execute(
+                "INSERT INTO checkpoints (job, time, pixels) VALUES (?, ?, ?)", (job, now, pixels)
+            )
+        return True
+
+    def finish(self, job, worker):
+        """
+        Mark the job as done, return False if `worker` does not hold it anymore
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = 'done', finished = ?, error = NULL"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job, worker),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job, worker, error):
+        """
+        Queue the job again, or mark it as failed after `MAX_ATTEMPTS` attempts
+        Return False if `worker` does not hold the job anymore
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET error = ?,"
+            " status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, MAX_ATTEMPTS, job, worker),
+        )
+        return cursor.rowcount > 0
+
+    def retry(self):
+        """
+        Queue failed jobs again with new attempts and return their number
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0 WHERE status = 'failed'"
+        )
+        return cursor.rowcount
+
+    def jobs(self, status=None):
+        """
+        Return the jobs (with the given status)
+        """
+        query = f"SELECT {COLUMNS} FROM jobs"
+        if status is None:
+            rows = self.connection.execute(query + " ORDER BY id")
+        else:
+            rows = self.connection.execute(query + " WHERE status = ? ORDER BY id", (status,))
+        return [Job(*row) for row in rows]
+
+    def throughput(self, window=WINDOW):
+        """
+        Return the pixels rendered per second by all workers over the last `window` seconds
+        (None without two checkpoints)
+        """
+        checkpoints = self.connection.execute(
+            "SELECT time, pixels FROM checkpoints WHERE time >= ? ORDER BY time",
+            (time.time() - window,),
+        ).fetchall()
+        if len(checkpoints) < 2 or checkpoints[-1][0] <= checkpoints[0][0]:
+            return None
+        # Pixels of the first checkpoint were rendered before the window
+        pixels = sum(pixels for _, pixels in checkpoints[1:])
+        return pixels / (checkpoints[-1][0] - checkpoints[0][0])
+
+    def status(self):
+        """
+        Return the number of jobs of each status, the throughput (pixels per second),
+        the remaining pixels of queued and running jobs and the estimated time to render them
+        """
+        counts = dict.fromkeys(("queued", "running", "done", "failed"), 0)
+        for status, count in self.connection.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ):
+            counts[status] = count
+        (remaining,) = self.connection.execute(
+            "SELECT COALESCE(SUM(width * height - rendered), 0) FROM jobs"
+            " WHERE status IN ('queued', 'running')"
+        ).fetchone()
+        throughput = self.throughput()
+        eta = remaining / throughput if throughput else None
+        return counts, throughput, remaining, eta
+
+    def transaction(self):
+        """
+        Return a context which holds the write lock of the database until it exits
+        """
+        return _Transaction(self.connection)
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, kind, value, traceback):
+        self.connection.execute("ROLLBACK" if kind else "COMMIT")
+
+
+def render_job(queue, job, cache=None, tile_size=TILE_SIZE):
+    """
+    Render a job tile by tile into a memory-mapped checkpoint next to its output
+    (`.npy` and `.tiles.npy`, see `streaming.open_image`) and return the output
+    Tiles already on the disk are not rendered again, so that a job resumes after a crash
+    The image is saved at the end and the checkpoint removed
+    Return None if the worker of the job (see `JobQueue.claim`) lost it to another worker,
+    which renders the remaining tiles
+    """
+    with open(job.config, "r") as f:
+        configuration = json.load(f)
+    configuration["scene"] = scene_parameters(configuration, job.width, job.height, job.max_depth)
+    zoom = configuration["scene"][2]
+    output = Path(job.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint = output.with_suffix(".npy")
+    grid = (-(-job.height // tile_size), -(-job.width // tile_size))
+    image, flags = open_image(checkpoint, (job.height, job.width, 3), np.float32, grid)
+    tiles = generate_tiles(job.width, job.height, tile_size)
+    indexes = {tile: (tile[0] // tile_size, tile[2] // tile_size) for tile in tiles}
+    remaining = [tile for tile in tiles if not flags[indexes[tile]]]
+    rendered = job.width * job.height - sum((b - t) * (r - l) for t, b, l, r in remaining)
+
+    scene = generate_scene(configuration, cache=cache)
+    args = (scene, job.max_depth, job.width, job.height, zoom)
+    options = json.loads(job.options)
+    for tile in remaining:
+        top, bottom, left, right = tile
+        colors = generate_image(*args, tile=tile, display=False, **options)
+        image[top:bottom, left:right] = convert(colors, image.dtype)
+        image.flush()
+        flags[indexes[tile]] = 1
+        flags.flush()
+        pixels = (bottom - top) * (right - left)
+        rendered += pixels
+        if not queue.checkpoint(job.id, job.worker, pixels, rendered):
+            return None
+
+    plt.imsave(output, np.asarray(image))
+    del image, flags
+    # Another worker which took the job over may have removed them
+    checkpoint.unlink(missing_ok=True)
+    checkpoint.with_suffix(".tiles.npy").unlink(missing_ok=True)
+    return output
+
+
+def work(filename, cache=None):
+    """
+    Render jobs of the queue until none is left and return the number of rendered jobs
+    A failing job is queued again (see `JobQueue.fail`), a job taken over by another
+    worker is left to it
+    """
+    queue = JobQueue(filename)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    count = 0
+    try:
+        while (job := queue.claim(worker)) is not None:
+            try:
+                output = render_job(queue, job, cache)
+            except Exception as error:
+                queue.fail(job.id, worker, f"{type(error).__name__}: {error}")
+                continue
+            if output is not None and queue.finish(job.id, worker):
+                count += 1
+    finally:
+        queue.close()
+    return count
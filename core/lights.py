@@ -0,0 +1,109 @@
+from math import inf, sqrt
+import numpy as np
+
+CUTOFF = 1 / 256  # attenuated intensity under which a light is culled (one 8-bit level)
+
+
+def reach(intensity, attenuation):
+    """
+    Return the distance beyond which a light attenuated by `1 / (c + l * d + q * d ** 2)`
+    is dimmer than `CUTOFF` (infinite without attenuation)
+    """
+    constant, linear, quadratic = attenuation
+    threshold = intensity / CUTOFF - constant
+    if quadratic > 0:
+        return (-linear + sqrt(max(linear**2 + 4 * quadratic * threshold, 0))) / (2 * quadratic)
+    if linear > 0:
+        return max(threshold / linear, 0)
+    return inf
+
+
+def reaching_lights(lights, points, reaches=True):
+    """
+    Return the pairs of points and lights (point-major) where lights are not culled:
+    points closer than their reach (without `reaches`, at any distance) and inside
+    their cone for spot lights
+    `lights` is a `RenderLights`, the pairs are the indexes of their points and of their
+    lights and the distances between them
+    """
+    owners, sources, distances = [], [], []
+    for index, position in enumerate(lights.positions):
+        vectors = points - position
+        lengths = np.linalg.norm(vectors, axis=1)
+        kept = lengths <= lights.reaches[index] if reaches else np.ones(len(points), dtype=bool)
+        if lights.cones[index] > -inf:
+            kept &= vectors @ lights.axes[index] >= lights.cones[index] * lengths
+        kept = np.flatnonzero(kept)
+        owners.append(kept)
+        sources.append(np.full(len(kept), index))
+        distances.append(lengths[kept])
+    owners, sources, distances = (np.concatenate(arrays) for arrays in (owners, sources, distances))
+    order = np.argsort(owners, kind="stable")
+    return owners[order], sources[order], distances[order]
+
+
+def attenuate(lights, sources, distances):
+    """
+    Return the attenuation of the lights of pairs at their distances
+    """
+    constant, linear, quadratic = lights.attenuations[sources].T
+    return 1 / (constant + (linear + quadratic * distances) * distances)
+
+
+def tile_generator(tile):
+    """
+    Return the random generator of a tile `(top, bottom, left, right)` seeded by its origin,
+    so that renderings are reproducible and tiles do not draw the same numbers
+    """
+    top, _, left, _ = tile
+    return np.random.default_rng([top, left])
+
+
+def sample_lights(owners, sources, weights, budget, generator):
+    """
+    Return the pairs (see `reaching_lights`) whose shadow rays are traced and their factors
+    Points reached by more than `budget` lights keep `budget` of them, drawn with
+    probabilities proportional to `weights` (with replacement, lights drawn several times
+    are traced once), factors divide contributions by their probability so that
+    the sum over lights is unbiased; other points keep all their lights (factor 1)
+    Crowded points whose weights are all zero keep no light (they receive nothing)
+    """
+    factors = np.ones(len(owners))
+    counts = np.bincount(owners)
+    crowded = counts[owners] > budget
+    if not crowded.any():
+        return np.arange(len(owners)), factors
+    pairs = np.flatnonzero(crowded)
+    # Cumulative weights of the lights of each crowded point
+    cumulative = np.cumsum(weights[pairs])
+    points, starts = np.unique(owners[pairs], return_index=True)
+    before = np.concatenate(([0], cumulative))[starts]
+    totals = np.append(before[1:], cumulative[-1]) - before
+    draws = np.repeat(np.flatnonzero(totals > 0), budget)
+    targets = before[draws] + generator.random(len(draws)) * totals[draws]
+    drawn = np.minimum(np.searchsorted(cumulative, targets, side="right"), len(pairs) - 1)
+    drawn, times = np.unique(drawn, return_counts=True)
+    probabilities = weights[pairs[drawn]] / totals[np.searchsorted(points, owners[pairs[drawn]])]
+    factors[pairs[drawn]] = times / (budget * probabilities)
+    kept = np.sort(np.concatenate((np.flatnonzero(~crowded), pairs[drawn])))
+    return kept, factors[kept]
+
+
+def illuminate(shading, objects, i2c, n2s, owners, sources, i2l, factors):
+    """
+    Vectorized version of `raytracing.contribute`
+    Return the illumination of each point: its ambient term plus the diffuse and specular
+    terms of the lights of its pairs, scaled by their factors
+    `shading` is the `Shading` of the scene and `objects` the objects of the points,
+    `objects`, `i2c` and `n2s` have one row per point, `i2l` one row per pair
+    """
+    illumination = shading.ambient[objects]
+    pairs = objects[owners]
+    cosines = np.einsum("ij,ij->i", i2l, n2s[owners])
+    diffuse = shading.diffuse[pairs, sources] * (cosines * factors)[:, None]
+    np.add.at(illumination, owners, diffuse)
+    halfways = i2l + i2c[owners]
+    halfways /= np.linalg.norm(halfways, axis=1)[:, None]
+    k = np.einsum("ij,ij->i", n2s[owners], halfways) ** shading.exponents[pairs]
+    np.add.at(illumination, owners, shading.specular[pairs, sources] * (k * factors)[:, None])
+    return illumination
@@ -0,0 +1,60 @@
+from math import inf
+from vtkmodules.util.numpy_support import vtk_to_numpy
+from .wavefront import screen_rays
+import numpy as np
+import vtk
+
+REDUCTION = 0.75  # each level keeps a quarter of the triangles of the previous one
+MIN_TRIANGLES = 256  # triangles of the coarsest levels
+TRIANGLES_PER_PIXEL = 1  # triangles of the selected level per pixel covered by the object
+
+
+def decimate(polydata):
+    """
+    Return the polydata without `REDUCTION` of its triangles (`vtkQuadricDecimation`)
+    Vertex normals are interpolated from the given mesh if they are all defined,
+    otherwise the decimated mesh has none
+    """
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputData(polydata)
+    decimation = vtk.vtkQuadricDecimation()
+    decimation.SetInputConnection(triangles.GetOutputPort())
+    decimation.SetTargetReduction(REDUCTION)
+    normals = polydata.GetPointData().GetNormals()
+    if normals is not None and np.isfinite(vtk_to_numpy(normals)).all():
+        decimation.AttributeErrorMetricOn()
+    decimation.Update()
+    return decimation.GetOutput()
+
+
+def pixel_pitch(scene, width, zoom):
+    """
+    Return the position of the camera and the angle between the rays of two neighbouring
+    pixels at the centre of the screen
+    """
+    x = np.array([0, 2 / max(width - 1, 1)])
+    origin, directions = screen_rays(scene, zoom, x, np.zeros(2))
+    return origin, np.arccos(np.clip(directions[0] @ directions[1], -1, 1))
+
+
+def covered_pixels(lower, upper, origin, pitch):
+    """
+    Return the number of pixels covered by the bounding sphere of a box seen from `origin`
+    (infinite if `origin` is inside)
+    """
+    lower, upper = np.asarray(lower), np.asarray(upper)
+    center, radius = (lower + upper) / 2, np.linalg.norm(upper - lower) / 2
+    distance = np.linalg.norm(center - origin)
+    if distance <= radius:
+        return inf
+    return np.pi * (np.arcsin(radius / distance) / pitch) ** 2
+
+
+def select_level(levels, pixels):
+    """
+    Return the coarsest of the `levels` (finest first) with enough triangles for `pixels`
+    """
+    for level in reversed(levels):
+        if level.polydata.GetNumberOfCells() >= TRIANGLES_PER_PIXEL * pixels:
+            return level
+    return levels[0]
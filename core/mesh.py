@@ -0,0 +1,377 @@
+from collections import namedtuple
+from math import inf
+from pathlib import Path
+
+from vtkmodules.util.numpy_support import vtk_to_numpy
+import numpy as np
+
+EPSILON = 1e-8
+LEAF_SIZE = 8
+PACKET_SIZE = 64  # rays of a packet (8x8 pixels for primary rays, see `wavefront.tile_order`)
+
+# Flattened bounding volume hierarchy
+# - `lower` and `upper` are the corners of each node box
+# - `children` is the index of the left child (the right one is next to it) or -1 for a leaf
+# - `start` and `count` give the range of triangles of a leaf
+BVH = namedtuple("BVH", ["lower", "upper", "children", "start", "count"])
+
+
+def extract_triangles(polydata):
+    """
+    Return:
+    - the point ids of each triangle
+    - the id of the cell each triangle comes from
+    Polygons are split in fans, therefore a cell may give several triangles
+    The first triangle of every cell comes first
+    """
+    polys = polydata.GetPolys()
+    offsets = vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64)
+    connectivity = vtk_to_numpy(polys.GetConnectivityArray()).astype(np.int64)
+    sizes = np.diff(offsets)
+    # Polys come after verts and lines in the cell ids of a `vtkPolyData`
+    first = polydata.GetNumberOfVerts() + polydata.GetNumberOfLines()
+
+    triangles = []
+    cells = []
+    for k in range(1, sizes.max(initial=2) - 1):
+        selection = np.flatnonzero(sizes > k + 1)
+        start = offsets[selection]
+        fan = np.stack((start, start + k, start + k + 1), axis=1)
+        triangles.append(connectivity[fan])
+        cells.append(selection + first)
+    if not triangles:
+        return np.empty((0, 3), np.int64), np.empty(0, np.int64)
+    return np.concatenate(triangles), np.concatenate(cells)
+
+
+def first_triangles(count, triangles, cells):
+    """
+    Return the first three point ids of each of the `count` cells (-1 for cells without
+    triangles) as used to interpolate normals
+    `triangles` and `cells` are given by `extract_triangles`
+    """
+    cell_points = np.full((count, 3), -1, dtype=np.int64)
+    first = len(np.unique(cells))
+    cell_points[cells[:first]] = triangles[:first]
+    return cell_points
+
+
+def build_bvh(lower, upper, leaf_size=LEAF_SIZE):
+    """
+    Return the flattened BVH of the boxes given by their corners
+    and the order in which the boxes are referenced by the leaves
+    """
+    centroids = (lower + upper) * 0.5
+    order = np.arange(len(lower))
+    nodes = [[0, len(lower), -1]]  # start, count, children
+    stack = [0]
+    while stack:
+        index = stack.pop()
+        start, count, _ = nodes[index]
+        if count <= leaf_size:
+            continue
+        indexes = order[start : start + count]
+        extent = centroids[indexes].max(axis=0) - centroids[indexes].min(axis=0)
+        axis = np.argmax(extent)
+        if extent[axis] == 0:
+            continue
+        half = count // 2
+        split = np.argpartition(centroids[indexes, axis], half)
+        order[start : start + count] = indexes[split]
+        nodes[index][2] = len(nodes)
+        stack.extend((len(nodes), len(nodes) + 1))
+        nodes.append([start, half, -1])
+        nodes.append([start + half, count - half, -1])
+
+    start, count, children = np.array(nodes, dtype=np.int64).T
+    node_lower = np.empty((len(nodes), 3))
+    node_upper = np.empty((len(nodes), 3))
+    # Children are always stored after their parent
+    for index in reversed(range(len(nodes))):
+        if children[index] == -1:
+            indexes = order[start[index] : start[index] + count[index]]
+            node_lower[index] = lower[indexes].min(axis=0)
+            node_upper[index] = upper[indexes].max(axis=0)
+        else:
+            left = children[index]
+            node_lower[index] = np.minimum(node_lower[left], node_lower[left + 1])
+            node_upper[index] = np.maximum(node_upper[left], node_upper[left + 1])
+    return BVH(node_lower, node_upper, children, start, count), order
+
+
+def intersect_boxes(lower, upper, origins, inverses):
+    """
+    Return the entry and exit distances of rays through axis-aligned boxes
+    """
+    with np.errstate(invalid="ignore"):
+        t1 = (lower - origins) * inverses
+        t2 = (upper - origins) * inverses
+    # NaN (origin on a slab of a parallel ray) does not bound the interval: fmin/fmax skip it
+    near = np.fmax.reduce(np.fmin(t1, t2), axis=-1)
+    far = np.fmin.reduce(np.fmax(t1, t2), axis=-1)
+    return near, far
+
+
+def frustums(origin, directions, size=PACKET_SIZE):
+    """
+    Return the inward normals of the 4 planes through `origin` bounding each packet
+    of `size` consecutive rays and the angular width of the packets
+    (None if the rays do not all go in the same half-space)
+    A box is out of the frustum of a packet if it is behind one of its planes
+    """
+    forward = directions.sum(axis=0)
+    forward /= np.linalg.norm(forward)
+    axis = np.eye(3)[np.argmin(np.abs(forward))]
+    right = np.cross(forward, axis)
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+    depths = directions @ forward
+    if (depths <= EPSILON).any():
+        return None
+    starts = np.arange(0, len(directions), size)
+    u, v = directions @ right / depths, directions @ up / depths
+    bounds = (np.minimum.reduceat(u, starts), np.maximum.reduceat(u, starts))
+    bounds += (np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts))
+    spreads = np.maximum(bounds[1] - bounds[0], bounds[3] - bounds[2])
+    umin, umax, vmin, vmax = (bound[:, None] * forward for bound in bounds)
+    return np.stack((right - umin, umax - right, up - vmin, vmax - up), axis=1), spreads
+
+
+def intersect_triangles(vertices, edges1, edges2, origins, directions):
+    """
+    Return the distances between the origins and the triangles (Möller–Trumbore)
+    Arrays of triangles and arrays of rays are broadcast against each other
+    Missed triangles have an infinite distance
+    """
+    pvec = np.cross(directions, edges2)
+    det = np.einsum("...i,...i", edges1, pvec)
+    valid = np.abs(det) > EPSILON
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_det = 1 / det
+        tvec = origins - vertices
+        u = np.einsum("...i,...i", tvec, pvec) * inv_det
+        qvec = np.cross(tvec, edges1)
+        v = np.einsum("...i,...i", directions, qvec) * inv_det
+        t = np.einsum("...i,...i", edges2, qvec) * inv_det
+    valid &= (u >= 0) & (v >= 0) & (u + v <= 1) & (t > EPSILON)
+    return np.where(valid, t, inf)
+
+
+class Mesh:
+    """
+    Store triangles of a `vtkPolyData` in contiguous arrays sorted along a BVH
+    """
+
+    ARRAYS = [
+        "vertices",
+        "normals",
+        "triangles",
+        "cells",
+        "cell_points",
+        "origins",
+        "edges1",
+        "edges2",
+    ]
+
+    def __init__(self, polydata, normals, leaf_size=LEAF_SIZE):
+        vertices = vtk_to_numpy(polydata.GetPoints().GetData()).astype(np.float64)
+        triangles, cells = extract_triangles(polydata)
+        corners = vertices[triangles]
+        self.bvh, order = build_bvh(corners.min(axis=1), corners.max(axis=1), leaf_size)
+
+        self.cell_points = first_triangles(polydata.GetNumberOfCells(), triangles, cells)
+        self.vertices = vertices
+        self.normals = np.ascontiguousarray(vtk_to_numpy(normals), dtype=np.float64)
+        self.triangles = np.ascontiguousarray(triangles[order])
+        self.cells = np.ascontiguousarray(cells[order])
+        corners = corners[order]
+        self.origins = np.ascontiguousarray(corners[:, 0])
+        self.edges1 = corners[:, 1] - corners[:, 0]
+        self.edges2 = corners[:, 2] - corners[:, 0]
+
+    def save(self, directory):
+        """
+        Save arrays in `directory` as `.npy` files
+        """
+        directory = Path(directory)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        for name, array in zip(BVH._fields, self.bvh):
+            np.save(directory / f"bvh_{name}.npy", array)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Return a mesh whose arrays are memory-mapped from `directory`
+        """
+        directory = Path(directory)
+        load = lambda name: np.asarray(np.load(directory / f"{name}.npy", mmap_mode="r"))
+        mesh = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(mesh, name, load(name))
+        mesh.bvh = BVH(*(load(f"bvh_{name}") for name in BVH._fields))
+        return mesh
+
+    def intersect(self, origins, directions, max_distance=inf):
+        """
+        Return for each ray:
+        - the distance between the origin and the nearest intersection (`inf` if missed)
+        - the index of the intersected triangle (-1 if missed)
+        `max_distance` is either a scalar or one distance per ray
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        with np.errstate(divide="ignore"):
+            inverses = 1 / directions
+
+        distances = np.array(np.broadcast_to(max_distance, len(origins)), dtype=np.float64)
+        hits = np.full(len(origins), -1, dtype=np.int64)
+        if len(origins) >= PACKET_SIZE and (origins == origins[0]).all():
+            packets = frustums(origins[0], directions)
+            if packets is not None:
+                args = (origins[0], directions, inverses, distances, hits, *packets)
+                self.intersect_packets(*args)
+                distances[hits == -1] = inf
+                return distances, hits
+        children = self.bvh.children
+        stack = [(0, np.arange(len(origins)))]
+        while stack:
+            node, rays = stack.pop()
+            rays = self.enter(node, rays, origins, inverses, distances)
+            if not rays.size:
+                continue
+            if children[node] != -1:
+                stack.append((children[node], rays))
+                stack.append((children[node] + 1, rays))
+                continue
+            self.intersect_leaf(node, rays, origins, directions, distances, hits)
+        distances[hits == -1] = inf
+        return distances, hits
+
+    def intersect_packets(self, origin, directions, inverses, distances, hits, planes, spreads):
+        """
+        Traverse the BVH with packets of `PACKET_SIZE` consecutive rays leaving `origin`
+        (`planes` and `spreads` given by `frustums`)
+        A packet enters a node if the node is in its frustum and not farther than the hits
+        of all its rays, it splits into rays tested one by one in nodes smaller than itself
+        `distances` and `hits` are updated in place
+        """
+        origins = np.broadcast_to(origin, directions.shape)
+        scale = np.linalg.norm(directions, axis=1).max()  # distance covered per unit of `t`
+        # Farthest distance of the rays of each packet, padded rays are ignored
+        padded = np.full(len(planes) * PACKET_SIZE, -inf)
+        padded[: len(distances)] = distances
+        farthest = padded.reshape(-1, PACKET_SIZE).max(axis=1)
+        offsets = np.arange(PACKET_SIZE)
+
+        lower, upper, children, _, _ = self.bvh
+        # Distances from `origin` to the boxes of the nodes and their sizes seen from `origin`
+        gaps = np.linalg.norm(np.maximum(np.maximum(lower - origin, origin - upper), 0), axis=1)
+        centers = np.linalg.norm((lower + upper) / 2 - origin, axis=1)
+        sizes = np.linalg.norm(upper - lower, axis=1) / np.maximum(centers, EPSILON)
+        stack = [(0, np.arange(len(planes)), np.empty(0, dtype=np.int64))]
+        while stack:
+            node, packets, rays = stack.pop()
+            if packets.size:
+                normals = planes[packets]
+                corners = np.where(normals > 0, upper[node], lower[node]) - origin
+                inside = (np.einsum("pij,pij->pi", normals, corners) >= 0).all(axis=1)
+                packets = packets[inside & (gaps[node] <= farthest[packets] * scale)]
+                # All packets split in leaves
+                whole = (spreads[packets] <= sizes[node]) & (children[node] != -1)
+                split = (packets[~whole, None] * PACKET_SIZE + offsets).ravel()
+                rays = np.concatenate((rays, split[split < len(distances)]))
+                packets = packets[whole]
+            if rays.size:
+                rays = self.enter(node, rays, origins, inverses, distances)
+            if not packets.size and not rays.size:
+                continue
+            if children[node] != -1:
+                # The nearest child is traversed first, its hits cull the farthest one
+                left, right = children[node], children[node] + 1
+                if gaps[left] < gaps[right]:
+                    left, right = right, left
+                stack.append((left, packets, rays))
+                stack.append((right, packets, rays))
+                continue
+            self.intersect_leaf(node, rays, origins, directions, distances, hits)
+            padded[rays] = distances[rays]
+            touched = np.unique(rays // PACKET_SIZE)
+            farthest[touched] = padded.reshape(-1, PACKET_SIZE)[touched].max(axis=1)
+
+    def enter(self, node, rays, origins, inverses, distances):
+        """
+        Return the rays crossing the box of the node closer than their distances
+        """
+        lower, upper = self.bvh.lower[node], self.bvh.upper[node]
+        near, far = intersect_boxes(lower, upper, origins[rays], inverses[rays])
+        return rays[(near <= far) & (far >= 0) & (near < distances[rays])]
+
+    def intersect_leaf(self, node, rays, origins, directions, distances, hits):
+        """
+        Update the distances and the hits of the rays with the triangles of a leaf
+        """
+        start = self.bvh.start[node]
+        tris = slice(start, start + self.bvh.count[node])
+        t = intersect_triangles(
+            self.origins[tris],
+            self.edges1[tris],
+            self.edges2[tris],
+            origins[rays, None],
+            directions[rays, None],
+        )
+        nearest = t.argmin(axis=1)
+        t = t[np.arange(len(rays)), nearest]
+        closer = t < distances[rays]
+        distances[rays[closer]] = t[closer]
+        hits[rays[closer]] = nearest[closer] + start
+
+    def occluded(self, origins, directions, max_distances):
+        """
+        Return for each ray if any triangle is closer than its maximum distance
+        The traversal of a ray stops at the first blocker found
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        max_distances = np.broadcast_to(np.asarray(max_distances, dtype=np.float64), len(origins))
+        with np.errstate(divide="ignore"):
+            inverses = 1 / directions
+
+        blocked = np.zeros(len(origins), dtype=bool)
+        lower, upper, children, start, count = self.bvh
+        stack = [(0, np.arange(len(origins)))]
+        while stack:
+            node, rays = stack.pop()
+            rays = rays[~blocked[rays]]
+            near, far = intersect_boxes(lower[node], upper[node], origins[rays], inverses[rays])
+            rays = rays[(near <= far) & (far >= 0) & (near < max_distances[rays])]
+            if not rays.size:
+                continue
+            if children[node] != -1:
+                stack.append((children[node], rays))
+                stack.append((children[node] + 1, rays))
+                continue
+            tris = slice(start[node], start[node] + count[node])
+            t = intersect_triangles(
+                self.origins[tris],
+                self.edges1[tris],
+                self.edges2[tris],
+                origins[rays, None],
+                directions[rays, None],
+            )
+            blocked[rays[(t < max_distances[rays, None]).any(axis=1)]] = True
+        return blocked
+
+    def find_intersections(self, origins, directions, max_distance=inf):
+        """
+        Return:
+        - the distances between the origins and the intersections (`inf` if missed)
+        - the ids of intersected cells (-1 if missed)
+        - the coordinates of intersected points
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        distances, hits = self.intersect(origins, directions, max_distance)
+        cells = np.where(hits != -1, self.cells[hits], -1)
+        points = origins + np.where(hits != -1, distances, 0)[:, None] * directions
+        return distances, cells, points
@@ -1,16 +1,63 @@
 from collections import namedtuple
+from .cache import content_key
+from .compiled import Materials, MeshBuffers, RenderLights, RenderScene, Shading
+from .hierarchy import ObjectHierarchy
+from .instancing import Transform, object_bounds
+from .lights import reach
+from .lod import MIN_TRIANGLES, REDUCTION, covered_pixels, decimate, pixel_pitch, select_level
+from .mesh import Mesh, extract_triangles, first_triangles
+from .primitives import Sphere, Quad
+from vtkmodules.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+import numpy as np
 import vtk, glm
 
 Material = namedtuple("Material", ["ambient", "diffuse", "specular", "shininess", "reflection"])
-Object = namedtuple("Object", ["data", "material", "position", "orientation"])
+Object = namedtuple("Object", ["data", "material", "position", "orientation", "transform"])
+# Item of a `Data` which does not come from a configuration
+Source = namedtuple("Source", ["item", "key"])
+
+
+def finite_normals(polydata, normals):
+    """
+    Return the vertex normals where non-finite ones are replaced by the normals computed
+    from the faces around their vertex (`vtkPolyDataNormals`), so that every backend
+    and mode shades these vertices alike
+    """
+    array = vtk_to_numpy(normals)
+    invalid = ~np.isfinite(array).all(axis=1)
+    if not invalid.any():
+        return normals
+    vtknormal = vtk.vtkPolyDataNormals()
+    vtknormal.SetInputData(polydata)
+    vtknormal.ComputePointNormalsOn()
+    vtknormal.SplittingOff()
+    vtknormal.ConsistencyOff()  # points and cells keep their order
+    vtknormal.Update()
+    computed = vtk_to_numpy(vtknormal.GetOutput().GetPointData().GetNormals())
+    array[invalid] = computed[invalid]
+    normals.Modified()
+    return normals
 
 
 class Data:
     """
     Store vtkPolyData, normals and obbtree
+    The normals, the obbtree and the triangle arrays used by the `numpy` backend
+    are built on first use
+    With a `MeshCache`, the triangle arrays and the normals are loaded from the disk
+    (the content of files is only hashed then)
+    Spheres and planes also have a `primitive` intersected analytically
+    Decimated levels of detail of the mesh are also built on first use
     """
 
-    def __init__(self, obj):
+    def __init__(self, obj, cache=None):
+        self.cache = cache
+        self.key = content_key(obj.key) if cache and obj.key else None
+        self._mesh = cache.load(self.key) if self.key else None
+        self._obbtree = None
+        self._levels = None
+        self.primitive = None
+        self.source = obj.item
         if isinstance(obj.item, vtk.vtkPolyData):  # Planes
             polydata = obj.item
             normals = obj.item.GetPointData().GetNormals()
@@ -18,23 +65,94 @@ class Data:
             for i in range(4):
                 n = normals.GetTuple(i)
                 normals.SetTuple(i, -glm.vec3(n))
+            self.primitive = Quad.from_polydata(polydata, normals)
         elif isinstance(obj.item, vtk.vtkPLYReader):  # Ply object
             polydata = obj.item.GetOutput()
             normals = obj.item.GetOutput().GetPointData().GetNormals()
+        elif isinstance(obj.item, vtk.vtkTrivialProducer):  # Binary ply object
+            polydata = obj.item.GetOutputDataObject(0)
+            normals = polydata.GetPointData().GetNormals()
+        elif self._mesh is not None:  # Others with cached normals
+            polydata = obj.item.GetOutput()
+            normals = numpy_to_vtk(self._mesh.normals, deep=True)
         else:  # Others
             polydata = obj.item.GetOutput()
+            normals = None
+        if isinstance(obj.item, vtk.vtkSphereSource):
+            self.primitive = Sphere(obj.item.GetCenter(), obj.item.GetRadius())
+        if normals is not None:
+            normals = finite_normals(polydata, normals)
+        self.polydata = polydata
+        self._normals = normals
+
+    @property
+    def normals(self):
+        if self._normals is None:
             vtknormal = vtk.vtkPolyDataNormals()
-            vtknormal.SetInputConnection(obj.item.GetOutputPort())
+            vtknormal.SetInputConnection(self.source.GetOutputPort())
             vtknormal.ComputePointNormalsOn()
             vtknormal.ComputeCellNormalsOn()
             vtknormal.SplittingOff()
             vtknormal.FlipNormalsOff()
             vtknormal.AutoOrientNormalsOn()
             vtknormal.Update()
-            normals = vtknormal.GetOutput().GetPointData().GetNormals()
-        self.polydata = polydata
-        self.normals = normals
-        self.obbtree = obj.obbtree
+            self._normals = vtknormal.GetOutput().GetPointData().GetNormals()
+        return self._normals
+
+    @property
+    def obbtree(self):
+        if self._obbtree is None:
+            self._obbtree = vtk.vtkOBBTree()
+            self._obbtree.SetDataSet(self.polydata)
+            self._obbtree.BuildLocator()
+        return self._obbtree
+
+    @property
+    def bounds(self):
+        """
+        Return the lower and upper corners of the bounding box
+        """
+        if self.primitive is not None:
+            return self.primitive.bounds()
+        xmin, xmax, ymin, ymax, zmin, zmax = self.polydata.GetBounds()
+        return (xmin, ymin, zmin), (xmax, ymax, zmax)
+
+    def shading_arrays(self):
+        """
+        Return the vertices, the vertex normals and the first three point ids of each cell
+        The BVH of the mesh is not built for them
+        """
+        if self._mesh is not None:
+            return self._mesh.vertices, self._mesh.normals, self._mesh.cell_points
+        polydata = self.polydata
+        triangles, cells = extract_triangles(polydata)
+        cell_points = first_triangles(polydata.GetNumberOfCells(), triangles, cells)
+        vertices = vtk_to_numpy(polydata.GetPoints().GetData())
+        return vertices, vtk_to_numpy(self.normals), cell_points
+
+    @property
+    def levels(self):
+        """
+        Return the levels of detail of the mesh, finest first (see `core.lod`)
+        Each level is a `Data` with a quarter of the triangles of the previous one
+        """
+        if self._levels is None:
+            self._levels = [self]
+            polydata = self.polydata
+            while polydata.GetNumberOfCells() * (1 - REDUCTION) >= MIN_TRIANGLES:
+                polydata = decimate(polydata)
+                producer = vtk.vtkTrivialProducer()
+                producer.SetOutput(polydata)
+                self._levels.append(Data(Source(producer, None)))
+        return self._levels
+
+    @property
+    def mesh(self):
+        if self._mesh is None:
+            self._mesh = Mesh(self.polydata, self.normals)
+            if self.cache and self.key:
+                self.cache.store(self.key, self._mesh)
+        return self._mesh
 
 
 class Material:
@@ -52,11 +170,33 @@ class Material:
 
 
 class Light:
-    def __init__(self, position):
+    """
+    Store a point light, or a spot light lighting only inside its cone (half angle in degrees)
+    around the axis towards `focal_point` if `cone` is under 90 degrees
+    Its intensity is attenuated by `1 / (c + l * d + q * d ** 2)` at a distance `d`
+    """
+
+    def __init__(self, position, intensity=1, focal_point=None, cone=90, attenuation=(1, 0, 0)):
         self.position = position
         self.ambient = glm.vec3(1)
-        self.diffuse = glm.vec3(1)
-        self.specular = glm.vec3(1)
+        self.diffuse = glm.vec3(intensity)
+        self.specular = glm.vec3(intensity)
+        spot = focal_point is not None and cone < 90
+        self.axis = glm.normalize(glm.vec3(focal_point) - glm.vec3(position)) if spot else None
+        self.cone = cone
+        self.attenuation = tuple(attenuation)
+        self.reach = reach(intensity, self.attenuation)
+
+    @classmethod
+    def from_vtk(cls, light):
+        """
+        Return the light of a `vtkLight`, only positional lights have a cone and an attenuation
+        (like in VTK)
+        """
+        if not light.GetPositional():
+            return cls(light.GetPosition(), light.GetIntensity())
+        args = (light.GetFocalPoint(), light.GetConeAngle(), light.GetAttenuationValues())
+        return cls(light.GetPosition(), light.GetIntensity(), *args)
 
 
 class Scene:
@@ -64,18 +204,99 @@ class Scene:
     Store all elements to deal with raytracing
     """
 
-    def __init__(self, objects, actors, light, camera, display=True):
+    def __init__(self, objects, actors, lights, camera, display=True, cache=None):
+        shared = {}  # items with the same key share their data (and their trees)
+
+        def data(obj):
+            if obj.key is None:
+                return Data(obj, cache)
+            if obj.key not in shared:
+                shared[obj.key] = Data(obj, cache)
+            return shared[obj.key]
+
+        create = lambda obj: Object(data(obj), Material(obj), None, None, None)
+        self.objects = [create(obj) for obj in objects]
+        self.materials = Materials([obj.material for obj in self.objects])
+        # Spheres are generated at their position, the translation of their actor is baked
+        sphere = lambda obj: isinstance(obj.item, vtk.vtkSphereSource)
+        self._baked = [obj.position if sphere(obj) else (0, 0, 0) for obj in objects]
+        self._details = [obj.data for obj in self.objects]  # full data (see `select_levels`)
+        self._buffers = {}
+        self.update(actors, lights, camera)
+        if display:
+            self.print_informations()
+
+    def update(self, actors, lights, camera):
+        """
+        Read again the transforms of actors, the lights and the camera
+        `lights` is a `vtkLight` or a list of them, materials are premultiplied by
+        their colors once (see `Shading`)
+        The data of objects (polydata, normals, trees) are kept, rays are moved into
+        the local space of objects instead (see `core.instancing`)
+        """
         pos = lambda actor: glm.vec3(actor.GetPosition())
         orient = lambda actor: glm.vec3(actor.GetOrientation())
-        create = lambda obj, actor: Object(Data(obj), Material(obj), pos(actor), orient(actor))
-        self.objects = [create(obj, actor) for obj, actor in zip(objects, actors)]
-        self.light = Light(light.GetPosition())
+        place = lambda obj, actor, baked: obj._replace(
+            position=pos(actor),
+            orientation=orient(actor),
+            transform=Transform.from_actor(actor, baked),
+        )
+        objects = zip(self.objects, actors, self._baked)
+        self.objects = [place(*args) for args in objects]
+        lights = [lights] if isinstance(lights, vtk.vtkLight) else lights
+        self.lights = [Light.from_vtk(light) for light in lights]
+        self.shading = Shading(self.materials, RenderLights(self.lights))
         self.camera = glm.vec3(camera.GetPosition()) / 5
-        if display:
-            self.print_informations()
+        bounds = [object_bounds(obj) for obj in self.objects]
+        self.hierarchy = ObjectHierarchy(*zip(*bounds)) if bounds else None
+
+    def select_levels(self, width=None, height=None, zoom=1, primitives=False):
+        """
+        Use for each object the coarsest level of detail with enough triangles for the pixels
+        it covers in an image of `width` x `height` pixels (see `core.lod`)
+        Objects keep their primitive with `primitives`, without `width` the full meshes are used
+        """
+        if width is not None:
+            origin, pitch = pixel_pitch(self, width, zoom)
+
+        def select(obj, data):
+            if width is None or (primitives and data.primitive is not None):
+                return data
+            pixels = covered_pixels(*object_bounds(obj._replace(data=data)), origin, pitch)
+            return select_level(data.levels, min(pixels, width * height))
+
+        levels = [select(obj, data) for obj, data in zip(self.objects, self._details)]
+        if all(level is obj.data for level, obj in zip(levels, self.objects)):
+            return
+        self.objects = [obj._replace(data=level) for obj, level in zip(self.objects, levels)]
+        self._buffers = {}
+        bounds = [object_bounds(obj) for obj in self.objects]
+        self.hierarchy = ObjectHierarchy(*zip(*bounds))
+
+    def buffers(self, primitives=False):
+        """
+        Return the `MeshBuffers` of objects (without primitives if `primitives` is True)
+        They are built once, moving objects does not change their data
+        Objects sharing their data share their arrays
+        """
+        if primitives not in self._buffers:
+            arrays = {}
+            for obj in self.objects:
+                if id(obj.data) not in arrays:
+                    exact = primitives and obj.data.primitive is not None
+                    arrays[id(obj.data)] = None if exact else obj.data.shading_arrays()
+            self._buffers[primitives] = MeshBuffers([arrays[id(o.data)] for o in self.objects])
+        return self._buffers[primitives]
+
+    def compile(self, primitives=False, kernels=False):
+        """
+        Return the `RenderScene` of the current state of the scene
+        """
+        return RenderScene(self, primitives, kernels)
 
     def print_informations(self):
         print(f"Camera position: {self.camera}")
-        print(f"Light position: {self.light.position}")
+        for i, light in enumerate(self.lights):
+            print(f"Light {i} position: {light.position}")
         for i, obj in enumerate(self.objects):
             print(f"Object {i} position: {obj.position}")
@@ -0,0 +1,86 @@
+from .cache import CACHE_DIRECTORY
+
+# Options of `generate_image` shared by the renderers of configurations (parallel,
+# streaming, sequences and jobs) with their defaults
+RENDERING = {
+    "backend": "analytic",
+    "mode": "wavefront",
+    "samples": 1,
+    "lod": False,
+    "shadows": None,
+}
+
+
+def rendering_options(**options):
+    """
+    Return the rendering options given some of them, the others have their default
+    """
+    for name in options:
+        if name not in RENDERING:
+            raise Exception(f'"{name}" option not implemented')
+    return {**RENDERING, **options}
+
+
+def add_rendering_arguments(parser):
+    """
+    Add the arguments of the rendering options (see `RENDERING`) to a parser
+    """
+    parser.add_argument("--backend", default=RENDERING["backend"], help="intersection backend")
+    parser.add_argument("--mode", default=RENDERING["mode"], help="scalar or wavefront")
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=RENDERING["samples"],
+        help="maximum samples of a pixel (rounded up to 1 + 4k), added where the image is aliased",
+    )
+    parser.add_argument(
+        "--lod",
+        action="store_true",
+        help="intersect decimated meshes of objects covering few pixels",
+    )
+    parser.add_argument(
+        "--shadows",
+        type=int,
+        help="shadow rays of an intersection reached by more lights, drawn among them",
+    )
+
+
+def add_scene_arguments(parser):
+    """
+    Add the arguments overriding the size and the depth of a configuration to a parser
+    """
+    parser.add_argument("--width", type=int, help="override the width of the scene")
+    parser.add_argument("--height", type=int, help="override the height of the scene")
+    parser.add_argument("--max-depth", type=int, help="override the depth of the scene")
+
+
+def add_cache_argument(parser):
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=CACHE_DIRECTORY,
+        help=f"directory of cached meshes (default: {CACHE_DIRECTORY})",
+    )
+
+
+def parsed_options(args):
+    """
+    Return the rendering options of parsed arguments (see `add_rendering_arguments`)
+    """
+    return {name: getattr(args, name) for name in RENDERING}
+
+
+def scene_overrides(args):
+    """
+    Return the size and the depth given by parsed arguments (see `add_scene_arguments`)
+    """
+    return {"width": args.width, "height": args.height, "max_depth": args.max_depth}
+
+
+def scene_parameters(configuration, width=None, height=None, max_depth=None):
+    """
+    Return the parameters `[width, height, zoom, max_depth]` of the scene of a configuration,
+    the size and the depth are overridden by the given ones
+    """
+    default_width, default_height, zoom, default_depth = configuration["scene"]
+    return [width or default_width, height or default_height, zoom, max_depth or default_depth]
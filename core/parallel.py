@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from rich.progress import Progress
+from .generators import generate_scene
+from .options import rendering_options
+from .raytracing import generate_image
+import numpy as np
+
+TILE_SIZE = 64
+
+# State of a worker process (its scene, image and options), set once by its initializer
+worker = {}
+
+
+def generate_tiles(width, height, size=TILE_SIZE):
+    """
+    Return the tiles `(top, bottom, left, right)` covering the frame
+    """
+    return [
+        (top, min(top + size, height), left, min(left + size, width))
+        for top in range(0, height, size)
+        for left in range(0, width, size)
+    ]
+
+
+def _initialize(configuration, name, options, cache):
+    """
+    Build the scene of the worker and attach the shared image
+    """
+    width, height = configuration["scene"][:2]
+    worker["memory"] = shared_memory.SharedMemory(name=name)
+    worker["image"] = np.ndarray((height, width, 3), np.float64, worker["memory"].buf)
+    worker["scene"] = generate_scene(configuration, cache=cache)
+    worker["configuration"] = configuration
+    worker["options"] = options
+
+
+def _render_tile(tile):
+    """
+    Render a tile straight into the shared image
+    """
+    width, height, zoom, max_depth = worker["configuration"]["scene"]
+    top, bottom, left, right = tile
+    args = (worker["scene"], max_depth, width, height, zoom)
+    image = generate_image(*args, tile=tile, display=False, **worker["options"])
+    worker["image"][top:bottom, left:right] = image
+    return tile
+
+
+def generate_image_parallel(
+    configuration,
+    workers=None,
+    tile_size=TILE_SIZE,
+    cache=None,
+    **options,
+):
+    """
+    Return an array where raytracing was applied on the scene of the configuration
+    Tiles of the frame are shared between `workers` processes (all cores by default)
+    `cache` is an optional `MeshCache` used by every worker
+    `options` are the rendering options (see `options.rendering_options`)
+    """
+    width, height = configuration["scene"][:2]
+    options = rendering_options(**options)
+    size = height * width * 3 * np.dtype(np.float64).itemsize
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    image = None
+    try:
+        image = np.ndarray((height, width, 3), np.float64, memory.buf)
+        image[:] = 0
+        tiles = generate_tiles(width, height, tile_size)
+        initargs = (configuration, memory.name, options, cache)
+        with ProcessPoolExecutor(workers, initializer=_initialize, initargs=initargs) as pool:
+            with Progress(auto_refresh=False) as progress:
+                task = progress.add_task("Generating ...", total=len(tiles))
+                for future in as_completed([pool.submit(_render_tile, tile) for tile in tiles]):
+                    future.result()
+                    progress.advance(task)
+                    progress.refresh()
+        result = image.copy()
+    finally:
+        image = None
+        memory.close()
+        memory.unlink()
+    return result
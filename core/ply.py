@@ -0,0 +1,144 @@
+from collections import namedtuple
+from numpy.lib.recfunctions import structured_to_unstructured
+from vtkmodules.util.numpy_support import vtk_to_numpy
+import numpy as np
+import vtk
+
+# Scalar types of PLY properties
+TYPES = {
+    "char": "i1",
+    "uchar": "u1",
+    "short": "i2",
+    "ushort": "u2",
+    "int": "i4",
+    "uint": "u4",
+    "float": "f4",
+    "double": "f8",
+    "int8": "i1",
+    "uint8": "u1",
+    "int16": "i2",
+    "uint16": "u2",
+    "int32": "i4",
+    "uint32": "u4",
+    "float32": "f4",
+    "float64": "f8",
+}
+
+# Byte orders of binary formats
+FORMATS = {"binary_little_endian": "<", "binary_big_endian": ">"}
+
+# `properties` are `(name, type)` or `(name, (count type, item type))` for lists
+Element = namedtuple("Element", ["name", "count", "properties"])
+
+# Arrays of a PLY file, `normals` is None if the file has none
+PLY = namedtuple("PLY", ["vertices", "normals", "faces"])
+
+
+def read_header(filename):
+    """
+    Return the format, the elements and the size of the header of a PLY file
+    """
+    with open(filename, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise Exception(f'"{filename}" is not a PLY file')
+        format, elements = None, []
+        for line in iter(f.readline, b""):
+            words = line.decode("ascii").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "format":
+                format = words[1]
+            elif words[0] == "element":
+                elements.append(Element(words[1], int(words[2]), []))
+            elif words[0] == "property" and words[1] == "list":
+                elements[-1].properties.append((words[4], (words[2], words[3])))
+            elif words[0] == "property":
+                elements[-1].properties.append((words[2], words[1]))
+            elif words[0] == "end_header":
+                return format, elements, f.tell()
+    raise Exception(f'"{filename}" has no end of header')
+
+
+def read_records(data, offset, element, byteorder):
+    """
+    Return the records of an element starting at `offset` in the bytes `data` (a view)
+    Lists must have the same size in every record, None is returned otherwise
+    """
+    fields = []
+    for name, kind in element.properties:
+        if isinstance(kind, tuple):
+            count_type, item_type = (byteorder + TYPES[t] for t in kind)
+            # The size of the list is read in the first record
+            start = offset + np.dtype(fields).itemsize
+            count = data[start : start + np.dtype(count_type).itemsize].view(count_type)
+            count = int(count[0]) if element.count else 0
+            fields += [(f"{name}_count", count_type), (name, item_type, (count,))]
+        else:
+            fields.append((name, byteorder + TYPES[kind]))
+    dtype = np.dtype(fields)
+    if offset + element.count * dtype.itemsize > len(data):
+        return None
+    records = data[offset : offset + element.count * dtype.itemsize].view(dtype)
+    for name, kind in element.properties:
+        if isinstance(kind, tuple) and (records[f"{name}_count"] != dtype[name].shape[0]).any():
+            return None
+    return records
+
+
+def load_ply(filename):
+    """
+    Return the vertices, the normals and the faces of a binary PLY file as views
+    of the memory-mapped file, nothing is copied nor read before it is used
+    Faces must all have the same number of vertices, None is returned otherwise
+    (and for ASCII files or files without faces)
+    """
+    format, elements, offset = read_header(filename)
+    if format not in FORMATS:
+        return None
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    records = {}
+    for element in elements:
+        records[element.name] = read_records(data, offset, element, FORMATS[format])
+        if records[element.name] is None:
+            return None
+        offset += records[element.name].nbytes
+
+    if not {"vertex", "face"} <= records.keys():
+        return None
+    vertices, faces = records["vertex"], records["face"]
+    names = vertices.dtype.names
+    vertex = lambda fields: structured_to_unstructured(vertices[fields], copy=False)
+    normals = vertex(["nx", "ny", "nz"]) if {"nx", "ny", "nz"} <= set(names) else None
+    indexes = next(name for name in faces.dtype.names if faces.dtype[name].shape)
+    return PLY(vertex(["x", "y", "z"]), normals, faces[indexes])
+
+
+def to_vtk(array, vtk_array, components=3):
+    """
+    Return `vtk_array` filled with the values of `array`
+    VTK owns the memory, it is filled by numpy with a single copy
+    """
+    vtk_array.SetNumberOfComponents(components)
+    vtk_array.SetNumberOfValues(array.size)
+    vtk_to_numpy(vtk_array).reshape(array.shape)[...] = array
+    return vtk_array
+
+
+def to_polydata(ply):
+    """
+    Return a `vtkPolyData` of the arrays of a PLY file
+    """
+    polydata = vtk.vtkPolyData()
+    points = vtk.vtkPoints()
+    points.SetData(to_vtk(ply.vertices, vtk.vtkFloatArray()))
+    polydata.SetPoints(points)
+    if ply.normals is not None:
+        normals = to_vtk(ply.normals, vtk.vtkFloatArray())
+        normals.SetName("Normals")
+        polydata.GetPointData().SetNormals(normals)
+    count, size = ply.faces.shape
+    offsets = to_vtk(np.arange(0, (count + 1) * size, size), vtk.vtkIdTypeArray(), 1)
+    cells = vtk.vtkCellArray()
+    cells.SetData(offsets, to_vtk(ply.faces, vtk.vtkIdTypeArray(), 1))
+    polydata.SetPolys(cells)
+    return polydata
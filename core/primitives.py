@@ -0,0 +1,123 @@
+from math import inf
+from .mesh import EPSILON
+import numpy as np
+
+
+def dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+
+class Sphere:
+    """
+    Sphere intersected analytically
+    """
+
+    def __init__(self, center, radius):
+        self.center = np.array(center, dtype=np.float64)
+        self.radius = float(radius)
+
+    def find_intersections(self, origins, directions, max_distance=inf):
+        """
+        Return:
+        - the distances between the origins and the intersections (`inf` if missed)
+        - 0 for intersected rays, -1 otherwise
+        - the coordinates of intersected points
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        oc = origins - self.center
+        a = dot(directions, directions)
+        b = dot(directions, oc)
+        delta = b * b - a * (dot(oc, oc) - self.radius * self.radius)
+        root = np.sqrt(np.maximum(delta, 0))
+        t1 = (-b - root) / a
+        t2 = (-b + root) / a
+        distances = np.where(t1 > EPSILON, t1, np.where(t2 > EPSILON, t2, inf))
+        distances[(delta < 0) | (distances > max_distance)] = inf
+        hit = np.isfinite(distances)
+        points = origins + np.where(hit, distances, 0)[:, None] * directions
+        return distances, np.where(hit, 0, -1), points
+
+    def occluded(self, origins, directions, max_distances):
+        """
+        Return for each ray if the sphere is closer than its maximum distance
+        """
+        return self.find_intersections(origins, directions)[0] < max_distances
+
+    def bounds(self):
+        """
+        Return the lower and upper corners of the bounding box
+        """
+        return self.center - self.radius, self.center + self.radius
+
+    def normals(self, points):
+        """
+        Return the exact normals at points of the surface
+        """
+        return (np.asarray(points, dtype=np.float64) - self.center) / self.radius
+
+
+class Quad:
+    """
+    Rectangle intersected analytically
+    It is defined by a corner, two orthogonal edges and the normal of its face
+    """
+
+    def __init__(self, corner, edge1, edge2, normal):
+        self.corner = np.array(corner, dtype=np.float64)
+        self.edge1 = np.array(edge1, dtype=np.float64)
+        self.edge2 = np.array(edge2, dtype=np.float64)
+        self.normal = np.array(normal, dtype=np.float64)
+        self.normal /= np.linalg.norm(self.normal)
+
+    @classmethod
+    def from_polydata(cls, polydata, normals):
+        """
+        Return the quad of the first cell of a `vtkPolyData` with point normals
+        """
+        A, B, _, D = (polydata.GetPoint(i) for i in range(4))
+        corner = np.array(A)
+        return cls(corner, np.array(B) - corner, np.array(D) - corner, normals.GetTuple(0))
+
+    def find_intersections(self, origins, directions, max_distance=inf):
+        """
+        Return:
+        - the distances between the origins and the intersections (`inf` if missed)
+        - 0 for intersected rays, -1 otherwise
+        - the coordinates of intersected points
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        denominator = directions @ self.normal
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distances = ((self.corner - origins) @ self.normal) / denominator
+        points = origins + np.nan_to_num(distances, posinf=0, neginf=0)[:, None] * directions
+        local = points - self.corner
+        u = (local @ self.edge1) / (self.edge1 @ self.edge1)
+        v = (local @ self.edge2) / (self.edge2 @ self.edge2)
+        hit = (np.abs(denominator) > EPSILON) & (distances > EPSILON)
+        hit &= (distances <= max_distance) & (u >= 0) & (u <= 1) & (v >= 0) & (v <= 1)
+        distances = np.where(hit, distances, inf)
+        points[~hit] = origins[~hit]
+        return distances, np.where(hit, 0, -1), points
+
+    def occluded(self, origins, directions, max_distances):
+        """
+        Return for each ray if the quad is closer than its maximum distance
+        """
+        return self.find_intersections(origins, directions)[0] < max_distances
+
+    def bounds(self):
+        """
+        Return the lower and upper corners of the bounding box
+        """
+        corners = self.corner + np.array([[0, 0], [1, 0], [0, 1], [1, 1]]) @ np.array(
+            [self.edge1, self.edge2]
+        )
+        return corners.min(axis=0), corners.max(axis=0)
+
+    def normals(self, points):
+        """
+        Return the exact normals at points of the surface
+        """
+        return np.tile(self.normal, (len(points), 1))
@@ -0,0 +1,32 @@
+STRIDE = 8  # must be a power of two
+
+
+def interleaved_offsets(stride=STRIDE):
+    """
+    Return the offsets `(row, column)` of the passes with the size of the block
+    each rendered pixel covers in the preview
+    The first pass renders one pixel out of `stride`, each level halves the spacing
+    """
+    offsets = [((0, 0), stride)]
+    size = stride
+    while size > 1:
+        half = size // 2
+        for row in range(0, stride, size):
+            for column in range(0, stride, size):
+                offsets += [((row, column + half), half), ((row + half, column), half)]
+                offsets.append(((row + half, column + half), half))
+        size = half
+    return offsets
+
+
+def fill(preview, pixels, row, column, size, stride=STRIDE):
+    """
+    Copy the pixels rendered at the offset `(row, column)` of a pass into the preview
+    Each of them also fills the block of `size` pixels it covers
+    """
+    height, width, _ = preview.shape
+    for i in range(row, min(row + size, height)):
+        for j in range(column, min(column + size, width)):
+            block = preview[i::stride, j::stride]
+            block[...] = pixels[: len(block), : block.shape[1]]
+
@@ -1,11 +1,20 @@
 from .utils import *
+from .wavefront import generate_wavefront
+from .antialiasing import generate_adaptive
+from .statistics import DISABLED
+from .instancing import instanced, instanced_occlusion
+from .lights import attenuate, reaching_lights, sample_lights, tile_generator
+from .jit import CompiledMesh, warm_up
 import glm, vtk, numpy as np
 from math import inf, acos
 from vtkmodules.vtkCommonCore import mutable
 from rich.progress import Progress
 
+# Length of the segment cast for each ray
+MAX_DISTANCE = 500
 
-def find_intersection(obbtree, ray_origin, ray_direction):
+
+def find_intersection(obbtree, ray_origin, ray_direction, max_distance=MAX_DISTANCE):
     """
     Return:
     - the distance between the initial point and the intersection
@@ -13,7 +22,7 @@ def find_intersection(obbtree, ray_origin, ray_direction):
     - the coordinates of intersected point
     """
     p1 = ray_origin
-    p2 = ray_origin + 500 * ray_direction
+    p2 = ray_origin + max_distance * ray_direction
 
     points = vtk.vtkPoints()
     cellIds = vtk.vtkIdList()
@@ -35,92 +44,352 @@ def find_intersection(obbtree, ray_origin, ray_direction):
         return None, None, None
 
 
-def nearest_intersected_object(objects, ray_origin, ray_direction):
+def find_intersections(obbtree, ray_origins, ray_directions, max_distances=MAX_DISTANCE):
+    """
+    Batched version of `find_intersection`
+    Return arrays of distances (`inf` if missed), cell ids (-1 if missed) and points
+    """
+    distances = np.full(len(ray_origins), inf)
+    cellIds = np.full(len(ray_origins), -1)
+    points = np.zeros((len(ray_origins), 3))
+    max_distances = np.broadcast_to(max_distances, len(ray_origins))
+    rays = zip(ray_origins, ray_directions, max_distances)
+    for i, (origin, direction, max_distance) in enumerate(rays):
+        args = (glm.dvec3(*origin), glm.dvec3(*direction), float(max_distance))
+        distance, iD, x = find_intersection(obbtree, *args)
+        if distance:
+            distances[i], cellIds[i], points[i] = distance, iD, x
+    return distances, cellIds, points
+
+
+def find_occlusion(obbtree, ray_origin, ray_direction, distance):
+    """
+    Return True if any cell is closer than `distance` along the ray
+    """
+    p1 = ray_origin
+    p2 = ray_origin + min(distance, MAX_DISTANCE) * ray_direction
+    return obbtree.IntersectWithLine(p1, p2, None, None) != 0
+
+
+def find_occlusions(obbtree, ray_origins, ray_directions, distances):
+    """
+    Batched version of `find_occlusion`
+    """
+    rays = zip(ray_origins, ray_directions, np.broadcast_to(distances, len(ray_origins)))
+    return np.array(
+        [
+            find_occlusion(obbtree, glm.dvec3(*origin), glm.dvec3(*direction), float(distance))
+            for origin, direction, distance in rays
+        ],
+        dtype=bool,
+    )
+
+
+# Intersection backends given an object, ray origins, ray directions and maximum distances
+# `vtk` is the reference backend, `numpy` intersects batches of rays with a BVH
+# `analytic` intersects primitives (spheres and planes) exactly and meshes with a BVH
+# `jit` is `analytic` with compiled kernels (see `core.jit`), numpy without Numba
+# Rays are moved into the local space of objects with a transform (see `core.instancing`)
+BACKENDS = {
+    "vtk": lambda data, origins, directions, distances=inf: find_intersections(
+        data.obbtree, origins, directions, np.minimum(distances, MAX_DISTANCE)
+    ),
+    "numpy": lambda data, origins, directions, distances=inf: data.mesh.find_intersections(
+        origins, directions, np.minimum(distances, MAX_DISTANCE)
+    ),
+    "analytic": lambda data, origins, directions, distances=inf: (
+        data.primitive or data.mesh
+    ).find_intersections(origins, directions, np.minimum(distances, MAX_DISTANCE)),
+    "jit": lambda data, origins, directions, distances=inf: (
+        data.primitive or CompiledMesh(data.mesh)
+    ).find_intersections(origins, directions, np.minimum(distances, MAX_DISTANCE)),
+}
+# Backends intersecting the primitives of objects, whose normals are then exact
+PRIMITIVES = {"analytic", "jit"}
+BACKENDS = {name: instanced(f) for name, f in BACKENDS.items()}
+
+# Occlusion queries of backends given an object, ray origins, ray directions and distances
+OCCLUSIONS = {
+    "vtk": lambda data, origins, directions, distances: find_occlusions(
+        data.obbtree, origins, directions, distances
+    ),
+    "numpy": lambda data, origins, directions, distances: data.mesh.occluded(
+        origins, directions, np.minimum(distances, MAX_DISTANCE)
+    ),
+    "analytic": lambda data, origins, directions, distances: (
+        data.primitive or data.mesh
+    ).occluded(origins, directions, np.minimum(distances, MAX_DISTANCE)),
+    "jit": lambda data, origins, directions, distances: (
+        data.primitive or CompiledMesh(data.mesh)
+    ).occluded(origins, directions, np.minimum(distances, MAX_DISTANCE)),
+}
+OCCLUSIONS = {name: instanced_occlusion(f) for name, f in OCCLUSIONS.items()}
+
+
+def prepare(scene, backend="vtk"):
+    """
+    Build the acceleration structures used by the backend before rendering
+    and compile the kernels of the `jit` backend
+    """
+    if backend == "jit":
+        warm_up()
+    for obj in scene.objects:
+        if backend == "vtk":
+            obj.data.obbtree
+        elif backend == "numpy" or obj.data.primitive is None:
+            obj.data.mesh
+
+
+def nearest_intersected_object(
+    objects, ray_origin, ray_direction, backend="vtk", stats=DISABLED, hierarchy=None
+):
     """
     Return the nearest intersected object
+    The ray is clipped to the nearest intersection found so far
+    With an `ObjectHierarchy`, objects are visited nearest first and farther ones are skipped
     """
+    intersect = BACKENDS[backend]
     nearest_object, min_distance, subId, target = None, inf, -1, []
-    for obj in objects:
-        distance, iD, x = find_intersection(obj.data.obbtree, ray_origin, ray_direction)
+    if hierarchy is None:
+        indexes = range(len(objects))
+    else:
+        distances = np.array([inf])
+        candidates = hierarchy.candidates([ray_origin], [ray_direction], distances)
+        indexes = (index for index, _ in candidates)
+    for index in indexes:
+        obj = objects[index]
+        stats.test(index)
+        max_distance = min(min_distance, MAX_DISTANCE)
+        if backend == "vtk" and obj.transform is None:  # reference path without batching
+            args = (ray_origin, ray_direction, max_distance)
+            distance, iD, x = find_intersection(obj.data.obbtree, *args)
+        else:
+            args = ([ray_origin], [ray_direction], max_distance)
+            distances_, cellIds, points = intersect(obj, *args)
+            distance, iD, x = float(distances_[0]), int(cellIds[0]), tuple(points[0])
         if distance and distance < min_distance:
             min_distance = distance
             nearest_object = obj
             subId = iD
             target = x
+            if hierarchy is not None:
+                distances[0] = distance
     return nearest_object, min_distance, subId, target
 
 
-def contribute(material, light, i2c, i2l, n2s):
+def occluding_object(
+    objects,
+    ray_origin,
+    ray_direction,
+    distance,
+    backend="vtk",
+    stats=DISABLED,
+    first=None,
+    hierarchy=None,
+):
+    """
+    Return the index of the first object found closer than `distance` along the ray
+    (None if the ray is not occluded)
+    The object at index `first` is tested before the others
+    With an `ObjectHierarchy`, only objects whose box is crossed by the ray are tested
+    """
+    occlude = OCCLUSIONS[backend]
+    if hierarchy is None:
+        indexes = range(len(objects))
+    else:
+        candidates = hierarchy.candidates([ray_origin], [ray_direction], np.array([distance]))
+        indexes = [index for index, _ in candidates]
+    if first is not None:
+        indexes = [first, *(index for index in indexes if index != first)]
+    for index in indexes:
+        stats.test(index)
+        obj = objects[index]
+        if backend == "vtk" and obj.transform is None:  # reference path without batching
+            occluded = find_occlusion(obj.data.obbtree, ray_origin, ray_direction, distance)
+        else:
+            occluded = occlude(obj, [ray_origin], [ray_direction], distance)[0]
+        if occluded:
+            return index
+    return None
+
+
+def contribute(coefficients, lights, i2c, n2s):
     """
     Return the contribution value
+    `coefficients` are the shading coefficients of the object (see `Shading.coefficients`)
+    `lights` are the indexes of the visible lights with the direction towards them and their
+    factor (see `core.lights`)
     """
-    illumination = glm.vec3()
+    ambient, diffuse, specular, exponent = coefficients
     # ambiant
-    illumination += material.ambient * light.ambient
-    # diffuse
-    illumination += material.diffuse * light.diffuse * glm.dot(i2l, n2s)
-    # specular
-    k = glm.dot(n2s, glm.normalize(i2l + i2c)) ** (material.shininess * 0.25)
-    illumination += material.specular * light.specular * k
+    illumination = glm.vec3(ambient)
+    for light, i2l, factor in lights:
+        # diffuse
+        illumination += diffuse[light] * (glm.dot(i2l, n2s) * factor)
+        # specular
+        k = glm.dot(n2s, glm.normalize(i2l + i2c)) ** exponent
+        illumination += specular[light] * (k * factor)
     return illumination
 
 
-def generate_image(scene, max_depth=3, width=300, height=200, zoom=20):
+def generate_image(
+    scene,
+    max_depth=3,
+    width=300,
+    height=200,
+    zoom=20,
+    backend="vtk",
+    mode="scalar",
+    tile=None,
+    display=True,
+    stats=None,
+    samples=1,
+    lod=False,
+    shadows=None,
+):
     """
     Apply an array where raytracing was applied on the scene
+    `backend` is the name of the intersection backend (see `BACKENDS`)
+    `mode` is either "scalar" (pixel by pixel) or "wavefront" (all pixels at once)
+    `tile` restricts the rendering to the pixels `(top, bottom, left, right)` of the frame
+    `display` shows the progress bar
+    `stats` is an optional `Statistics` which counts rays and times stages
+    `samples` is the maximum number of samples of a pixel, more than one samples pixels
+    adaptively (see `core.antialiasing`) and `stats` keeps the number of samples of each pixel
+    `lod` intersects decimated meshes of objects covering few pixels (see `core.lod`)
+    `shadows` is the number of shadow rays of an intersection reached by more lights,
+    drawn among them (see `core.lights`), all lights are traced by default
     """
+    stats = stats or DISABLED
+    if backend not in BACKENDS:
+        raise Exception(f'"{backend}" backend not implemented')
+    if lod:
+        scene.select_levels(width, height, zoom, backend in PRIMITIVES)
+    else:
+        scene.select_levels()  # full meshes
+    top, bottom, left, right = tile or (0, height, 0, width)
+    if samples > 1:
+        if mode != "wavefront":
+            raise Exception(f'"{mode}" mode not implemented with several samples')
+        args = (max_depth, width, height, zoom, (top, bottom, left, right), display)
+        functions = (BACKENDS[backend], OCCLUSIONS[backend])
+        args = (*functions, *args, backend in PRIMITIVES, stats, samples)
+        kernels = backend == "jit"
+        image, counts = generate_adaptive(scene, *args, kernels=kernels, shadows=shadows)
+        stats.sample(counts)
+        return image
+    if mode == "wavefront":
+        args = (max_depth, width, height, zoom, (top, bottom, left, right), display)
+        functions = (BACKENDS[backend], OCCLUSIONS[backend])
+        args = (*functions, *args, backend in PRIMITIVES, stats)
+        return generate_wavefront(scene, *args, kernels=backend == "jit", shadows=shadows)
+    elif mode != "scalar":
+        raise Exception(f'"{mode}" mode not implemented')
+
     # Parameters
     ratio = width / height
     screen = (-1, 1 / ratio, 1, -1 / ratio)
 
     matrix_rot, matrix_trans = change_reference(glm.normalize(scene.camera))
+    objects = scene.objects
+    hierarchy = scene.hierarchy
+    nearest = lambda o, d: nearest_intersected_object(objects, o, d, backend, stats, hierarchy)
+    occlude = lambda o, d, t, first: occluding_object(
+        objects, o, d, t, backend, stats, first, hierarchy
+    )
+    indexes = {id(obj): index for index, obj in enumerate(objects)}
+    buffers = scene.buffers(backend in PRIMITIVES)
+    lights = scene.shading.lights
+    coefficients = scene.shading.coefficients
+    generator = tile_generator((top, bottom, left, right))  # shadow rays drawn with `shadows`
+    last = {}  # last occluder of each object and light
     # Initialization of the image
-    image = np.zeros((height, width, 3))
-    with Progress(auto_refresh=False) as progress:
-        task = progress.add_task("Generating ...", total=height)
-        for i, y in enumerate(np.linspace(screen[1], screen[3], height)):
-            for j, x in enumerate(np.linspace(screen[0], screen[2], width)):
+    rows = np.linspace(screen[1], screen[3], height)[top:bottom]
+    columns = np.linspace(screen[0], screen[2], width)[left:right]
+    image = np.zeros((len(rows), len(columns), 3))
+    stats.start(len(rows), len(columns))
+    with Progress(auto_refresh=False, disable=not display) as progress:
+        task = progress.add_task("Generating ...", total=len(rows))
+        for i, y in enumerate(rows):
+            for j, x in enumerate(columns):
                 # screen is on origin
                 pixel = matrix_rot * glm.vec3(x, y, 0) * zoom
-                origin = matrix_trans * scene.camera * zoom
-                direction = glm.normalize(pixel - origin)
+                # Rays are traced in double precision as in wavefront mode, so that
+                # intersections far from the camera are not shadowed by their own surface
+                origin = glm.dvec3(matrix_trans * scene.camera * zoom)
+                direction = glm.normalize(glm.dvec3(pixel) - origin)
 
                 color = glm.vec3()
                 reflection = 1
+                tests = stats.total_tests
 
-                for _ in range(max_depth):
+                for depth in range(max_depth):
                     # Check for intersections
-                    result = nearest_intersected_object(scene.objects, origin, direction)
+                    ray = "reflection" if depth else "primary"
+                    stats.count(ray)
+                    with stats.stage(ray):
+                        result = nearest(origin, direction)
                     nearest_object, min_distance, subId, target = result
                     if nearest_object is None:
                         break
 
                     # Exctract informations
-                    polydata = nearest_object.data.polydata
-                    normals = nearest_object.data.normals
+                    receiver = indexes[id(nearest_object)]
+                    data = nearest_object.data
                     material = nearest_object.material
                     intersection = origin + min_distance * direction
-                    points = [polydata.GetCell(subId).GetPoints().GetPoint(i) for i in range(3)]
-                    ids = [polydata.GetCell(subId).GetPointIds().GetId(i) for i in range(3)]
-                    normals = [normals.GetTuple(id_) for id_ in ids]
 
                     # Compute normal and intersection
                     # n2s = normal to surface
                     # i2l = intersection to light
                     # i2c = intersection to camera
-                    n2s = glm.normalize(interpolation(points, normals, target))
+                    with stats.stage("normals"):
+                        transform = nearest_object.transform
+                        if transform is not None:
+                            target = transform.points_to_local([target])[0].tolist()
+                        if backend in PRIMITIVES and data.primitive:
+                            normal = data.primitive.normals([target])[0]
+                        else:
+                            cell = buffers.offsets[receiver] + subId
+                            normal = buffers.interpolate_cell(cell, target)
+                        if transform is not None:
+                            normal = transform.normals_to_world([normal])[0]
+                        n2s = glm.normalize(glm.dvec3(*normal))
                     shifted_point = intersection + 1e-5 * n2s
-                    i2l = glm.normalize(scene.light.position - shifted_point)
 
-                    # Check if shadowed
-                    result = nearest_intersected_object(scene.objects, shifted_point, i2l)
-                    i2l_distance = glm.length(scene.light.position - intersection)
-                    if result[1] < i2l_distance:  # is shadowed
+                    # Lights reaching the intersection (see `core.lights`)
+                    with stats.stage("shadow"):
+                        pairs = reaching_lights(lights, np.array([intersection], dtype=np.float64))
+                        _, sources, distances = pairs
+                        factors = attenuate(lights, sources, distances)
+                        # An intersection whose lights are drawn is never entirely shadowed
+                        drawn = shadows is not None and len(sources) > shadows
+                        if shadows is not None:
+                            weights = factors * lights.diffuse[sources].max(axis=1)
+                            pairs, scales = sample_lights(*pairs[:2], weights, shadows, generator)
+                            sources, factors = sources[pairs], factors[pairs] * scales
+
+                    # Check if shadowed (the last occluder of this object is tested first)
+                    visible = []
+                    for source, factor in zip(sources.tolist(), factors.tolist()):
+                        light = scene.lights[source]
+                        i2l = glm.normalize(light.position - shifted_point)
+                        stats.count("shadow")
+                        i2l_distance = glm.length(light.position - intersection)
+                        with stats.stage("shadow"):
+                            first = last.get((receiver, source))
+                            occluder = occlude(shifted_point, i2l, i2l_distance, first)
+                        if occluder is None:
+                            visible.append((source, i2l, factor))
+                        else:
+                            last[receiver, source] = occluder
+                    if not visible and not drawn:  # is shadowed
                         break
 
                     # Contribution
-                    i2c = glm.normalize(scene.camera - intersection)
-                    illumination = contribute(material, scene.light, i2c, i2l, n2s)
+                    with stats.stage("contribute"):
+                        i2c = glm.normalize(glm.dvec3(scene.camera) - intersection)
+                        illumination = contribute(coefficients[receiver], visible, i2c, n2s)
 
                     # Reflection
                     color += reflection * illumination
@@ -131,6 +400,7 @@ def generate_image(scene, max_depth=3, width=300, height=200, zoom=20):
                     direction = reflected(direction, n2s)
 
                 image[i, j] = np.clip(color, 0, 1)
+                stats.cost(i * len(columns) + j, stats.total_tests - tests)
 
             progress.advance(task)
             progress.refresh()
@@ -0,0 +1,108 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from matplotlib import pyplot as plt
+from pathlib import Path
+from time import perf_counter
+from rich.progress import Progress
+from .generators import generate_scene
+from .options import rendering_options
+from .parallel import worker
+from .raytracing import generate_image
+import glm, os
+import numpy as np
+
+# Time spent on a frame by a worker (the process id), its image is saved as `filename`
+Timing = namedtuple("Timing", ["frame", "filename", "worker", "seconds"])
+
+
+def turntable(camera, frames):
+    """
+    Return `frames` positions of the camera making a full turn around the vertical axis
+    from `camera` (the camera always looks at the origin of the scene)
+    """
+    angles = np.linspace(0, 2 * np.pi, frames, endpoint=False)
+    x, y, z = camera
+    cosines, sines = np.cos(angles), np.sin(angles)
+    return np.stack((x * cosines + z * sines, np.full(frames, y), z * cosines - x * sines), axis=1)
+
+
+def interpolate_keyframes(keyframes, frames):
+    """
+    Return `frames` positions of the camera going through the `keyframes` (positions)
+    at a constant number of frames between two keyframes
+    """
+    keyframes = np.asarray(keyframes, dtype=np.float64)
+    times = np.linspace(0, len(keyframes) - 1, frames)
+    indexes = np.arange(len(keyframes))
+    return np.stack([np.interp(times, indexes, keyframes[:, k]) for k in range(3)], axis=1)
+
+
+def camera_path(configuration, frames, turn=False):
+    """
+    Return the positions of the camera of the frames: the keyframes `"path"` of the
+    configuration, or a turntable from its `"camera"` (without `"path"` or with `turn`)
+    """
+    if "path" in configuration and not turn:
+        return interpolate_keyframes(configuration["path"], frames)
+    return turntable(configuration["camera"], frames)
+
+
+def _initialize(configuration, options, cache):
+    """
+    Build the scene of the worker once for all its frames
+    """
+    worker["scene"] = generate_scene(configuration, cache=cache)
+    worker["configuration"] = configuration
+    worker["options"] = options
+
+
+def _render_frame(frame, camera, filename):
+    """
+    Move the camera of the scene of the worker, render the frame and save it
+    Meshes, normals and trees of the scene are kept from the previous frames
+    """
+    start = perf_counter()
+    width, height, zoom, max_depth = worker["configuration"]["scene"]
+    scene = worker["scene"]
+    scene.camera = glm.vec3(*camera) * zoom  # as `generate_scene`
+    args = (scene, max_depth, width, height, zoom)
+    image = generate_image(*args, display=False, **worker["options"])
+    plt.imsave(filename, image)
+    return Timing(frame, filename, os.getpid(), perf_counter() - start)
+
+
+def render_sequence(
+    configuration,
+    output,
+    frames,
+    turn=False,
+    workers=None,
+    cache=None,
+    **options,
+):
+    """
+    Render the frames of the camera path of the configuration (see `camera_path`) and
+    save them as `<name>-<frame>.png` in the `output` directory
+    Frames are shared between `workers` processes (all cores by default), each one builds
+    the scene once and renders its frames by moving the camera
+    Return the `Timing` of each frame, the first frame of a worker includes building
+    the meshes and their trees
+    `options` are the rendering options (see `options.rendering_options`)
+    """
+    cameras = camera_path(configuration, frames, turn)
+    name = Path(output) / configuration["name"]
+    options = rendering_options(**options)
+    initargs = (configuration, options, cache)
+    timings = []
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=initargs) as pool:
+        with Progress(auto_refresh=False) as progress:
+            task = progress.add_task("Generating ...", total=frames)
+            futures = [
+                pool.submit(_render_frame, frame, tuple(camera), f"{name}-{frame:04}.png")
+                for frame, camera in enumerate(cameras)
+            ]
+            for future in as_completed(futures):
+                timings.append(future.result())
+                progress.advance(task)
+                progress.refresh()
+    return sorted(timings)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from time import perf_counter
+import json
+import numpy as np
+
+
+class Stage:
+    """
+    Context manager adding the elapsed time to a stage
+    """
+
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.times[self.name] += perf_counter() - self.start
+
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class Statistics:
+    """
+    Count rays and time stages of a rendering
+    - rays are "primary", "shadow" or "reflection"
+    - stages are the intersections of each kind of ray, "normals" and "contribute"
+    - tests are the intersection tests (ray against object) per object index
+    With `heatmap`, the number of intersection tests of each pixel is kept as an image
+    With adaptive sampling, the number of samples of each pixel is kept as `samples`
+    """
+
+    def __init__(self, heatmap=False):
+        self.rays = defaultdict(int)
+        self.tests = defaultdict(int)
+        self.total_tests = 0
+        self.times = defaultdict(float)
+        self.track_heatmap = heatmap
+        self.heatmap = None
+        self.samples = None
+
+    def stage(self, name):
+        return Stage(self.times, name)
+
+    def count(self, name, number=1):
+        self.rays[name] += number
+
+    def test(self, index, number=1):
+        self.tests[index] += number
+        self.total_tests += number
+
+    def start(self, height, width):
+        """
+        Called at the beginning of a rendering of `height` x `width` pixels
+        """
+        if self.track_heatmap:
+            self.heatmap = np.zeros((height, width))
+
+    def cost(self, pixels, number):
+        """
+        Add `number` intersection tests to the flat indexes `pixels` of the heatmap
+        """
+        if self.heatmap is not None:
+            np.add.at(self.heatmap.reshape(-1), pixels, number)
+
+    def sample(self, counts):
+        """
+        Keep the number of samples of each pixel
+        """
+        self.samples = counts
+
+    def report(self):
+        """
+        Return a dictionary which can be dumped as JSON
+        """
+        report = {
+            "rays": dict(self.rays),
+            "total_rays": sum(self.rays.values()),
+            "tests": {f"object {index}": n for index, n in sorted(self.tests.items())},
+            "times": dict(self.times),
+        }
+        if self.heatmap is not None:
+            report["heatmap"] = {"max": self.heatmap.max(), "mean": self.heatmap.mean()}
+        if self.samples is not None:
+            samples = self.samples
+            report["samples"] = {"max": int(samples.max()), "mean": samples.mean()}
+        return report
+
+    def dump(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class DisabledStatistics(Statistics):
+    """
+    Statistics which do nothing, used when instrumentation is off
+    """
+
+    _stage = NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, number=1):
+        pass
+
+    def test(self, index, number=1):
+        pass
+
+    def start(self, height, width):
+        pass
+
+    def cost(self, pixels, number):
+        pass
+
+    def sample(self, counts):
+        pass
+
+
+DISABLED = DisabledStatistics()
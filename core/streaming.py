@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from rich.progress import Progress
+from .generators import generate_scene
+from .options import rendering_options
+from .parallel import TILE_SIZE, generate_tiles, worker
+from .raytracing import generate_image
+import numpy as np
+
+FORMATS = {"float32": np.float32, "uint8": np.uint8}
+
+
+def convert(image, dtype):
+    """
+    Return the colors of an image (between 0 and 1) in the format of the file
+    """
+    if dtype == np.uint8:
+        return np.round(image * 255).astype(np.uint8)
+    return image.astype(dtype)
+
+
+def open_image(filename, shape, dtype, grid):
+    """
+    Return the memory-mapped image and the flags of finished tiles (`grid` is their shape)
+    The flags are stored next to the image (`.tiles.npy`), existing files are reopened
+    """
+    filename = Path(filename)
+    flags_filename = filename.with_suffix(".tiles.npy")
+    if filename.exists() and flags_filename.exists():
+        image = np.load(filename, mmap_mode="r+")
+        flags = np.load(flags_filename, mmap_mode="r+")
+        if image.shape != shape or image.dtype != dtype or flags.shape != grid:
+            raise Exception(f'"{filename}" was rendered with another size, format or tile size')
+        return image, flags
+    open_memmap = np.lib.format.open_memmap
+    image = open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+    flags = open_memmap(flags_filename, mode="w+", dtype=np.uint8, shape=grid)
+    return image, flags
+
+
+def _initialize(configuration, filename, options, cache):
+    """
+    Build the scene of the worker and map the image file
+    """
+    worker["image"] = np.load(filename, mmap_mode="r+")
+    worker["scene"] = generate_scene(configuration, cache=cache)
+    worker["configuration"] = configuration
+    worker["options"] = options
+
+
+def _render_tile(tile):
+    """
+    Render a tile straight into the image file and flush it to the disk
+    """
+    width, height, zoom, max_depth = worker["configuration"]["scene"]
+    top, bottom, left, right = tile
+    args = (worker["scene"], max_depth, width, height, zoom)
+    image = generate_image(*args, tile=tile, display=False, **worker["options"])
+    worker["image"][top:bottom, left:right] = convert(image, worker["image"].dtype)
+    worker["image"].flush()
+    return tile
+
+
+def stream_image(
+    configuration,
+    filename,
+    format="float32",
+    workers=None,
+    tile_size=TILE_SIZE,
+    cache=None,
+    **options,
+):
+    """
+    Render the scene of the configuration into a memory-mapped `.npy` file tile by tile
+    The memory used stays bounded by the tiles being rendered and a tile is only marked as
+    finished once it is on the disk, so that an interrupted rendering resumes where it stopped
+    `format` is "float32" or "uint8" (colors scaled to 255)
+    `options` are the rendering options (see `options.rendering_options`)
+    """
+    if format not in FORMATS:
+        raise Exception(f'"{format}" format not implemented')
+    width, height = configuration["scene"][:2]
+    grid = (-(-height // tile_size), -(-width // tile_size))
+    _, flags = open_image(filename, (height, width, 3), FORMATS[format], grid)
+    tiles = generate_tiles(width, height, tile_size)
+    indexes = {tile: (tile[0] // tile_size, tile[2] // tile_size) for tile in tiles}
+    remaining = [tile for tile in tiles if not flags[indexes[tile]]]
+
+    options = rendering_options(**options)
+    initargs = (configuration, str(filename), options, cache)
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=initargs) as pool:
+        with Progress(auto_refresh=False) as progress:
+            task = progress.add_task("Generating ...", total=len(tiles))
+            progress.advance(task, len(tiles) - len(remaining))
+            for future in as_completed([pool.submit(_render_tile, tile) for tile in remaining]):
+                flags[indexes[future.result()]] = 1
+                flags.flush()
+                progress.advance(task)
+                progress.refresh()
+    return filename
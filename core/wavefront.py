@@ -0,0 +1,333 @@
+from itertools import chain
+from math import inf
+from rich.progress import Progress
+from .utils import change_reference
+from .statistics import DISABLED
+from .lights import attenuate, illuminate, reaching_lights, sample_lights, tile_generator
+from . import jit
+import glm, numpy as np
+
+
+def dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def reflected(vectors, axes):
+    """
+    Vectorized version of `utils.reflected`
+    """
+    return vectors - 2 * dot(vectors, axes)[:, None] * axes
+
+
+def primary_rays(scene, width, height, zoom, tile):
+    """
+    Return the origin and the directions of rays going through every pixel of the tile
+    """
+    top, bottom, left, right = tile
+    ratio = width / height
+    screen = (-1, 1 / ratio, 1, -1 / ratio)
+    y, x = np.meshgrid(
+        np.linspace(screen[1], screen[3], height)[top:bottom],
+        np.linspace(screen[0], screen[2], width)[left:right],
+        indexing="ij",
+    )
+    return screen_rays(scene, zoom, x.ravel(), y.ravel())
+
+
+def tile_order(shape, size=8):
+    """
+    Return the flat indexes of the pixels of an image of the given shape grouped
+    by squares of `size` pixels (row by row in each square)
+    Consecutive primary rays in this order are packets of close rays (see `Mesh.intersect`)
+    """
+    rows, columns = (indexes.ravel() for indexes in np.indices(shape))
+    return np.lexsort((columns, rows, columns // size, rows // size))
+
+
+def screen_rays(scene, zoom, x, y):
+    """
+    Return the origin and the directions of rays going through the points `(x, y)`
+    of the screen (the screen spans from -1 to 1 horizontally)
+    """
+    matrix_rot, matrix_trans = change_reference(glm.normalize(scene.camera))
+    rotation = np.array(matrix_rot.to_list()).T
+    pixels = np.stack((x, y, np.zeros(len(x))), axis=1)
+    pixels = (pixels @ rotation[:3, :3].T + rotation[:3, 3]) * zoom
+    origin = np.array(matrix_trans * scene.camera * zoom)
+    return origin, normalize(pixels - origin)
+
+
+def nearest_intersected_objects(
+    objects, intersect, origins, directions, stats=DISABLED, hierarchy=None, pixels=None
+):
+    """
+    Vectorized version of `raytracing.nearest_intersected_object`
+    Return the index of the nearest objects (-1 if missed), the distances, the cell ids
+    and the intersected points
+    Rays are clipped to the nearest intersection found so far
+    `pixels` are the pixels of the rays, given to count tests in the heatmap of `stats`
+    """
+    indexes = np.full(len(origins), -1)
+    min_distances = np.full(len(origins), inf)
+    subIds = np.full(len(origins), -1)
+    targets = np.zeros((len(origins), 3))
+    if hierarchy is None:
+        candidates = ((index, np.arange(len(origins))) for index in range(len(objects)))
+    else:
+        candidates = hierarchy.candidates(origins, directions, min_distances)
+    for index, rays in candidates:
+        stats.test(index, len(rays))
+        if pixels is not None:
+            stats.cost(pixels[rays], 1)
+        args = (origins[rays], directions[rays], min_distances[rays])
+        distances, cellIds, points = intersect(objects[index], *args)
+        closer = distances < min_distances[rays]
+        hits = rays[closer]
+        indexes[hits] = index
+        min_distances[hits] = distances[closer]
+        subIds[hits] = cellIds[closer]
+        targets[hits] = points[closer]
+    return indexes, min_distances, subIds, targets
+
+
+def occluding_objects(
+    objects,
+    occlude,
+    origins,
+    directions,
+    distances,
+    order,
+    stats=DISABLED,
+    hierarchy=None,
+    pixels=None,
+):
+    """
+    Vectorized version of `raytracing.occluding_object`
+    Return the index of the first object found closer than the distances (-1 if not)
+    Objects are tested in the given `order` and occluded rays are not tested anymore
+    With an `ObjectHierarchy`, only the first object of `order` is tested on all rays,
+    the others only on rays crossing their box
+    """
+    occluders = np.full(len(origins), -1)
+    if hierarchy is None:
+        candidates = ((index, None) for index in order)
+    else:
+        # Occluded rays get a negative distance so that the hierarchy skips them
+        remaining = np.array(distances, dtype=np.float64)
+        boxes = hierarchy.candidates(origins, directions, remaining)
+        candidates = [(order[0], None)]
+        candidates = chain(candidates, ((i, rays) for i, rays in boxes if i != order[0]))
+    alive = np.arange(len(origins))
+    for index, rays in candidates:
+        rays = alive if rays is None else rays[occluders[rays] == -1]
+        if not rays.size:
+            continue
+        stats.test(index, len(rays))
+        if pixels is not None:
+            stats.cost(pixels[rays], 1)
+        occluded = occlude(objects[index], origins[rays], directions[rays], distances[rays])
+        occluders[rays[occluded]] = index
+        alive = alive[occluders[alive] == -1]
+        if hierarchy is not None:
+            remaining[rays[occluded]] = -inf
+    return occluders
+
+
+def surface_normals(scene, indexes, subIds, targets):
+    """
+    Return the interpolated normals of the intersected cells
+    or the exact normals of intersected primitives
+    `scene` is a `RenderScene`
+    """
+    n2s = np.zeros((len(indexes), 3))
+    # Normals are computed in the local space of objects with a transform
+    moved = [index for index in np.unique(indexes) if scene.objects[index].transform]
+    targets = targets.copy() if moved else targets
+    for index in moved:
+        rays = np.flatnonzero(indexes == index)
+        targets[rays] = scene.objects[index].transform.points_to_local(targets[rays])
+    exact = scene.exact[indexes]
+    for index in np.unique(indexes[exact]):
+        rays = np.flatnonzero(indexes == index)
+        n2s[rays] = scene.objects[index].data.primitive.normals(targets[rays])
+    rays = np.flatnonzero(~exact)
+    cells = scene.buffers.offsets[indexes[rays]] + subIds[rays]
+    if scene.kernels:
+        n2s[rays] = jit.interpolate(scene.buffers, cells, targets[rays])
+    else:
+        n2s[rays] = scene.buffers.interpolate(cells, targets[rays])
+    for index in moved:
+        rays = np.flatnonzero(indexes == index)
+        n2s[rays] = scene.objects[index].transform.normals_to_world(n2s[rays])
+    return normalize(n2s)
+
+
+def generate_wavefront(
+    scene,
+    intersect,
+    occlude,
+    max_depth=3,
+    width=300,
+    height=200,
+    zoom=20,
+    tile=None,
+    display=True,
+    primitives=False,
+    stats=DISABLED,
+    kernels=False,
+    shadows=None,
+):
+    """
+    Return an array where raytracing was applied on the scene
+    All rays of the frame (or of the tile) are processed together, one bounce at a time
+    `intersect` and `occlude` are the functions of a backend
+    `primitives` tells if `intersect` uses the primitives of objects
+    Shading reads the compact `RenderScene` of the scene
+    `stats` counts rays and times stages
+    `kernels` shades with compiled kernels (see `core.jit`)
+    `shadows` bounds the number of shadow rays of each intersection (see `trace_rays`)
+    """
+    top, bottom, left, right = tile = tile or (0, height, 0, width)
+    shape = (bottom - top, right - left)
+    render = scene.compile(primitives, kernels)
+    origin, directions = primary_rays(scene, width, height, zoom, tile)
+    stats.start(*shape)
+    args = (render, intersect, occlude, origin, directions, shape, max_depth, display, stats)
+    return trace_tiles(*args, shadows, tile_generator(tile))
+
+
+def trace_tiles(
+    render,
+    intersect,
+    occlude,
+    origin,
+    directions,
+    shape,
+    max_depth=3,
+    display=True,
+    stats=DISABLED,
+    shadows=None,
+    generator=None,
+):
+    """
+    Return the image of the primary rays of `primary_rays`, traced in the order of `tile_order`
+    so that primary rays are intersected by packets
+    """
+    order = tile_order(shape)
+    args = (render, intersect, occlude, origin, directions[order], max_depth, display, stats)
+    colors = np.empty((len(order), 3))
+    colors[order] = trace_rays(*args, order, shadows, generator)
+    return colors.reshape(*shape, 3)
+
+
+def trace_rays(
+    render,
+    intersect,
+    occlude,
+    origin,
+    directions,
+    max_depth=3,
+    display=True,
+    stats=DISABLED,
+    pixels=None,
+    shadows=None,
+    generator=None,
+):
+    """
+    Return the colors of primary rays leaving `origin` in `directions`, one bounce at a time
+    `render` is the `RenderScene` of the scene
+    `pixels` are the pixels of the rays (flat indexes) in the heatmap of `stats`
+    `shadows` is the number of shadow rays of an intersection reached by more lights
+    (see `lights.sample_lights`), all lights are traced by default
+    `generator` draws the shadow rays, the caller seeds it (see `lights.tile_generator`)
+    """
+    origins = np.tile(origin, (len(directions), 1))
+    rays = np.arange(len(directions))
+    pixels = rays if pixels is None else pixels
+    lights, camera = render.lights, render.camera.position
+    if generator is None:
+        generator = np.random.default_rng()
+    reflections = np.ones(len(directions))
+    colors = np.zeros((len(directions), 3))
+    # Objects which occluded the most are tested first by shadow rays
+    occlusions = np.zeros(len(render.objects), dtype=np.int64)
+    hierarchy = render.hierarchy
+    heatmap = stats.heatmap is not None  # tests are added to the pixels of the rays
+    shade = jit.illuminate if render.kernels else illuminate
+
+    with Progress(auto_refresh=False, disable=not display) as progress:
+        task = progress.add_task("Generating ...", total=max_depth)
+        for depth in range(max_depth):
+            # Intersect
+            ray = "reflection" if depth else "primary"
+            stats.count(ray, len(origins))
+            with stats.stage(ray):
+                args = (render.objects, intersect, origins, directions, stats, hierarchy)
+                traced = pixels[rays] if heatmap else None
+                result = nearest_intersected_objects(*args, traced)
+            indexes, min_distances, subIds, targets = result
+            alive = indexes != -1
+            origins, directions, rays, reflections = (
+                array[alive] for array in (origins, directions, rays, reflections)
+            )
+            indexes, min_distances, subIds, targets = (
+                array[alive] for array in (indexes, min_distances, subIds, targets)
+            )
+            if not len(rays):
+                break
+
+            # Shade
+            with stats.stage("normals"):
+                intersections = origins + min_distances[:, None] * directions
+                n2s = surface_normals(render, indexes, subIds, targets)
+                shifted_points = intersections + 1e-5 * n2s
+
+            # Shadow test of the lights reaching each intersection (see `core.lights`)
+            with stats.stage("shadow"):
+                owners, sources, i2l_distances = reaching_lights(lights, intersections)
+                factors = attenuate(lights, sources, i2l_distances)
+                lit = np.zeros(len(rays), dtype=bool)
+                if shadows is not None:
+                    # Intersections whose lights are drawn are never entirely shadowed
+                    lit = np.bincount(owners, minlength=len(rays)) > shadows
+                    weights = factors * lights.diffuse[sources].max(axis=1)
+                    pairs, scales = sample_lights(owners, sources, weights, shadows, generator)
+                    owners, sources = owners[pairs], sources[pairs]
+                    i2l_distances, factors = i2l_distances[pairs], factors[pairs] * scales
+                i2l = normalize(lights.positions[sources] - shifted_points[owners])
+                stats.count("shadow", len(owners))
+                order = np.argsort(-occlusions, kind="stable")
+                args = (render.objects, occlude, shifted_points[owners], i2l, i2l_distances)
+                traced = pixels[rays[owners]] if heatmap else None
+                occluders = occluding_objects(*args, order, stats, hierarchy, traced)
+            visible = occluders == -1
+            occlusions += np.bincount(occluders[~visible], minlength=len(render.objects))
+            # Intersections seen by no light are shadowed, their paths stop
+            lit[owners[visible]] = True
+            owners = (np.cumsum(lit) - 1)[owners[visible]]
+            sources, i2l, factors = sources[visible], i2l[visible], factors[visible]
+            directions, rays, reflections = directions[lit], rays[lit], reflections[lit]
+            indexes, intersections, n2s = indexes[lit], intersections[lit], n2s[lit]
+            shifted_points = shifted_points[lit]
+
+            # Contribution
+            with stats.stage("contribute"):
+                i2c = normalize(camera - intersections)
+                args = (i2c, n2s, owners, sources, i2l, factors)
+                illumination = shade(render.shading, indexes, *args)
+
+            # Reflection
+            colors[rays] += reflections[:, None] * illumination
+            reflections = reflections * render.shading.reflection[indexes]
+
+            # New initial coordinates
+            origins = shifted_points
+            directions = reflected(directions, n2s)
+
+            progress.advance(task)
+            progress.refresh()
+    return np.clip(colors, 0, 1)
@@ -0,0 +1,87 @@
+from core.cache import MeshCache
+from core.jobs import JobQueue, WINDOW, work
+from core.options import add_cache_argument, add_rendering_arguments, add_scene_arguments
+from core.options import parsed_options, scene_overrides, scene_parameters
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from render import find_configurations
+import argparse, json
+
+
+def duration(seconds):
+    """
+    Return a duration as `hours:minutes:seconds`
+    """
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+def add(queue, args):
+    """
+    Queue a job for each configuration, the size and the depth default to the configuration
+    """
+    options = parsed_options(args)
+    for file in find_configurations(args.paths):
+        with open(file, "r") as f:
+            configuration = json.load(f)
+        width, height, _, max_depth = scene_parameters(configuration, **scene_overrides(args))
+        output = Path(args.output) / f"{configuration['name']}-{width}x{height}-{max_depth}.png"
+        job, output = queue.add(file.resolve(), width, height, max_depth, output.resolve(), options)
+        print(f"{job}: {file} ({width}x{height}, depth {max_depth}) -> {output}")
+
+
+def status(queue):
+    """
+    Print the number of jobs of each status, the progress of running jobs,
+    the throughput and the estimated time to render queued and running jobs
+    """
+    counts, throughput, remaining, eta = queue.status()
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    for job in queue.jobs("running"):
+        progress = job.rendered / (job.width * job.height)
+        print(f"{job.id}: {job.config} {progress:.0%} ({job.worker}, attempt {job.attempts})")
+    for job in queue.jobs("failed"):
+        print(f"{job.id}: {job.config} failed ({job.error})")
+    if throughput is None:
+        print(f"Throughput: no checkpoint in the last {duration(WINDOW)}")
+    else:
+        print(f"Throughput: {throughput:,.0f} pixels/s over the last {duration(WINDOW)}")
+        print(f"Remaining: {remaining:,} pixels, ETA {duration(eta)}")
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Queue of render jobs rendered by workers")
+    parser.add_argument("--database", default="./farm.db", help="SQLite database of the queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_add = commands.add_parser("add", help="queue configurations")
+    parser_add.add_argument("paths", nargs="+", help="configuration files or directories")
+    parser_add.add_argument("-o", "--output", default="./images", help="directory of images")
+    add_rendering_arguments(parser_add)
+    add_scene_arguments(parser_add)
+
+    parser_work = commands.add_parser("work", help="render jobs until the queue is empty")
+    parser_work.add_argument("-w", "--workers", type=int, default=1, help="worker processes")
+    add_cache_argument(parser_work)
+
+    commands.add_parser("status", help="show jobs, throughput and ETA")
+    commands.add_parser("retry", help="queue failed jobs again")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    queue = JobQueue(args.database)
+    if args.command == "add":
+        add(queue, args)
+    elif args.command == "status":
+        status(queue)
+    elif args.command == "retry":
+        print(f"{queue.retry()} failed jobs queued again")
+    elif args.command == "work":
+        cache = MeshCache(args.cache) if args.cache else None
+        with ProcessPoolExecutor(args.workers) as pool:
+            futures = [pool.submit(work, args.database, cache) for _ in range(args.workers)]
+            print(f"{sum(future.result() for future in futures)} jobs rendered")
+    queue.close()
@@ -10,6 +10,7 @@ ITEMS = {
 }
 MATERIAL = ["color", "ambient", "diffuse", "specular", "shininess", "reflection"]
 LIGHT = ["position", "cone angle"]
+LIGHTS = LIGHT + ["intensity", "attenuation"]
 
 
 def describe(filename):
@@ -46,6 +47,10 @@ def describe(filename):
         elif spec == "light":
             string = "Light:{" + ", ".join(starmap(formatter, zip(LIGHT, lvl1))) + "}"
             msg.append(string)
+        elif spec == "lights":
+            for i, light in enumerate(lvl1):
+                string = f"Light {i}:{{" + ", ".join(starmap(formatter, zip(LIGHTS, light))) + "}"
+                msg.append(string)
         elif spec == "target":
             msg.append("Selected object, where light focuses on, is " + str(lvl1))
         elif spec == "camera":
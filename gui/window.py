@@ -1,9 +1,10 @@
-from core import generate_image, Scene
+from core import Scene
 from core.generators import *
+from core.interactive import RenderCache
 from functools import partial
 
 from matplotlib import pyplot as plt
-import glm
+import glm, numpy as np
 
 
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
@@ -11,6 +12,7 @@ from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt
 from PyQt5 import QtCore
+from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtWidgets import (
     QGridLayout,
     QGroupBox,
@@ -45,6 +47,31 @@ class Camera(vtk.vtkCamera):
         print(", ".join(map(fmt2.format, self.position)))
 
 
+class RenderThread(QtCore.QThread):
+    """
+    Render a scene progressively without blocking the event loop
+    A preview is emitted after each pass, the rendering stops between two passes
+    The `RenderCache` renders again only what changed since the previous rendering
+    """
+
+    rendered = QtCore.pyqtSignal(object, float)
+
+    def __init__(self, cache, scene, max_depth, width, height, zoom):
+        super().__init__()
+        self.cache = cache
+        self.arguments = (scene, max_depth, width, height, zoom)
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        for preview, fraction in self.cache.generate(*self.arguments):
+            if self.stopped:
+                break
+            self.rendered.emit(preview.copy(), fraction)
+
+
 class Window(QWidget):
     def __init__(self, config):
         super(Window, self).__init__()
@@ -55,7 +82,7 @@ class Window(QWidget):
 
         self.initialize()
         self.set_camera(config["camera"])
-        self.set_light(self.actors[config["target"]], *config["light"])
+        self.set_lights(self.actors[config["target"]], config)
         self.set_widgets()
 
         self.setWindowTitle("VTK Raytracing")
@@ -80,16 +107,15 @@ class Window(QWidget):
         self.camera.SetPosition(glm.vec3(position) * self.zoom * 5)  # offset = 5
         self.iren.AddObserver("EndInteractionEvent", self.camera.get_orientation)
 
-    def set_light(self, target, position, angle):
-        self.light = vtk.vtkLight()
-        self.light.SetPosition(position)
-        self.light.SetConeAngle(angle)
-        self.light.SetFocalPoint(target.GetPosition())
-        self.light.PositionalOn()
-        self.light_actor = vtk.vtkLightActor()
-        self.light_actor.SetLight(self.light)
-        self.renderer.AddLight(self.light)
-        self.renderer.AddViewProp(self.light_actor)
+    def set_lights(self, target, config):
+        self.lights = generate_lights(config, target)
+        self.light_actors = []
+        for light in self.lights:
+            light_actor = vtk.vtkLightActor()
+            light_actor.SetLight(light)
+            self.renderer.AddLight(light)
+            self.renderer.AddViewProp(light_actor)
+            self.light_actors.append(light_actor)
         self.renderer.UseShadowsOn()
 
     def set_widgets(self):
@@ -113,12 +139,21 @@ class Window(QWidget):
             self.change_slider_intensity,
             lambda obj: obj.GetIntensity() * 10,
         ]
-        grid = self.add_widget(grid, self.create_coord(self.light, "Light", functions))
+        for i, light in enumerate(self.lights):
+            label = "Light" if len(self.lights) == 1 else f"Light {i}"
+            grid = self.add_widget(grid, self.create_coord(light, label, functions))
+
+        self.button = QPushButton()
+        self.button.setText("Raytracing")
+        self.button.clicked.connect(self.button_action)
+        grid = self.add_widget(grid, self.button)
 
-        button = QPushButton()
-        button.setText("Raytracing")
-        button.clicked.connect(self.button_action)
-        grid = self.add_widget(grid, button)
+        self.preview = QLabel()
+        self.preview.setAlignment(Qt.AlignCenter)
+        grid = self.add_widget(grid, self.preview)
+        self.thread = None
+        self.scene = None  # kept between renderings with its data
+        self.cache = RenderCache()
 
         self.setLayout(grid)
 
@@ -196,7 +231,33 @@ class Window(QWidget):
         return groupBox
 
     def button_action(self):
-        scene = Scene(self.objects, self.actors, self.light, self.camera)
-        image = generate_image(scene, self.max_depth, self.width, self.height, self.zoom)
-        plt.imsave(f"./images/{self.name}.png", image)
-        print("Saved.")
+        if self.thread is not None and self.thread.isRunning():
+            self.thread.stop()
+            return
+        if self.scene is None:
+            self.scene = Scene(self.objects, self.actors, self.lights, self.camera)
+        else:
+            self.scene.update(self.actors, self.lights, self.camera)
+        args = (self.scene, self.max_depth, self.width, self.height, self.zoom)
+        self.thread = RenderThread(self.cache, *args)
+        self.thread.rendered.connect(self.show_preview)
+        self.thread.finished.connect(lambda: self.button.setText("Raytracing"))
+        self.button.setText("Stop")
+        self.thread.start()
+
+    def closeEvent(self, event):
+        if self.thread is not None:
+            self.thread.stop()
+            self.thread.wait()
+        super().closeEvent(event)
+
+    def show_preview(self, image, fraction):
+        pixels = np.ascontiguousarray(image * 255, dtype=np.uint8)
+        height, width, _ = pixels.shape
+        qimage = QImage(pixels.data, width, height, 3 * width, QImage.Format_RGB888)
+        pixmap = QPixmap.fromImage(qimage)  # copied, `pixels` can be released
+        self.preview.setPixmap(pixmap.scaledToWidth(min(width, 450)))
+        self.button.setText(f"Stop ({fraction:.0%})")
+        if fraction == 1:
+            plt.imsave(f"./images/{self.name}.png", image)
+            print("Saved.")
@@ -0,0 +1,103 @@
+from core import generate_image
+from core.generators import generate_scene
+from core.cache import MeshCache
+from core.statistics import Statistics
+from core.parallel import generate_image_parallel
+from core.streaming import stream_image, FORMATS
+from core.options import add_cache_argument, add_rendering_arguments, add_scene_arguments
+from core.options import RENDERING, parsed_options, scene_overrides, scene_parameters
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib import pyplot as plt
+from pathlib import Path
+import argparse, json
+
+
+def find_configurations(paths):
+    """
+    Return configuration files given files or directories
+    """
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.json")) if path.is_dir() else [path])
+    return files
+
+
+def render(path, output, options, display=True):
+    """
+    Render a configuration file and save the image in the `output` directory
+    With statistics, the report and the heatmap are saved next to the image
+    """
+    with open(path, "r") as f:
+        configuration = json.load(f)
+    configuration["scene"] = scene_parameters(configuration, **options["overrides"])
+    width, height, zoom, max_depth = configuration["scene"]
+    rendering = {name: options[name] for name in RENDERING}
+    cache = MeshCache(options["cache"]) if options["cache"] else None
+    name = Path(output) / configuration["name"]
+    if options["stream"]:
+        filename = f"{name}.npy"
+        args = (configuration, filename, options["stream"], options["workers"])
+        return stream_image(*args, cache=cache, **rendering)
+    if options["workers"]:
+        workers = options["workers"]
+        image = generate_image_parallel(configuration, workers, cache=cache, **rendering)
+    else:
+        stats = Statistics(options["heatmap"]) if options["stats"] else None
+        scene = generate_scene(configuration, display, cache)
+        args = (scene, max_depth, width, height, zoom)
+        image = generate_image(*args, display=display, stats=stats, **rendering)
+    plt.imsave(f"{name}.png", image)
+    if options["stats"]:
+        stats.dump(f"{name}-stats.json")
+    if options["heatmap"]:
+        plt.imsave(f"{name}-heatmap.png", stats.heatmap, cmap="inferno")
+        if stats.samples is not None:
+            plt.imsave(f"{name}-samples.png", stats.samples, cmap="inferno")
+    return f"{name}.png"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Render configurations without any window")
+    parser.add_argument("paths", nargs="+", help="configuration files or directories")
+    parser.add_argument("-o", "--output", default="./images", help="directory of images")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="concurrent configurations")
+    parser.add_argument("-w", "--workers", type=int, help="processes sharing the tiles of an image")
+    add_rendering_arguments(parser)
+    add_cache_argument(parser)
+    parser.add_argument(
+        "--stream",
+        nargs="?",
+        const="float32",
+        choices=list(FORMATS),
+        help="write tiles into a memory-mapped .npy file and resume it if it exists",
+    )
+    parser.add_argument("--stats", action="store_true", help="save rays and stages statistics")
+    parser.add_argument("--heatmap", action="store_true", help="save the cost of each pixel")
+    add_scene_arguments(parser)
+    args = parser.parse_args()
+    if (args.workers or args.stream) and (args.stats or args.heatmap):
+        parser.error("--stats and --heatmap are not available with --workers or --stream")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    options = {
+        **parsed_options(args),
+        "overrides": scene_overrides(args),
+        "workers": args.workers,
+        "cache": args.cache,
+        "stream": args.stream,
+        "stats": args.stats or args.heatmap,
+        "heatmap": args.heatmap,
+    }
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    files = find_configurations(args.paths)
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            futures = [pool.submit(render, file, args.output, options, False) for file in files]
+            for file, future in zip(files, futures):
+                print(f"{file} -> {future.result()}")
+    else:
+        for file in files:
+            print(f"{file} -> {render(file, args.output, options)}")
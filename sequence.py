@@ -0,0 +1,46 @@
+from core.cache import MeshCache
+from core.options import add_cache_argument, add_rendering_arguments, add_scene_arguments
+from core.options import parsed_options, scene_overrides, scene_parameters
+from core.sequence import render_sequence
+from pathlib import Path
+import argparse, json
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Render the frames of a camera path")
+    parser.add_argument("path", help="configuration file")
+    parser.add_argument("-f", "--frames", type=int, default=36, help="number of frames")
+    parser.add_argument(
+        "--turntable",
+        action="store_true",
+        help='turn around the scene even if the configuration has a "path" of keyframes',
+    )
+    parser.add_argument("-o", "--output", default="./frames", help="directory of frames")
+    parser.add_argument("-w", "--workers", type=int, help="processes sharing the frames")
+    add_rendering_arguments(parser)
+    add_cache_argument(parser)
+    add_scene_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    with open(args.path, "r") as f:
+        configuration = json.load(f)
+    configuration["scene"] = scene_parameters(configuration, **scene_overrides(args))
+    cache = MeshCache(args.cache) if args.cache else None
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    options = parsed_options(args)
+    timings = render_sequence(
+        configuration, args.output, args.frames, args.turntable, args.workers, cache, **options
+    )
+    for timing in timings:
+        print(f"{timing.filename}: {timing.seconds:.2f}s (worker {timing.worker})")
+    seconds = [timing.seconds for timing in timings]
+    print(
+        f"{len(seconds)} frames: {sum(seconds):.2f}s in total, {sum(seconds) / len(seconds):.2f}s"
+        f" per frame (min {min(seconds):.2f}s, max {max(seconds):.2f}s)"
+    )
+    filename = Path(args.output) / f"{configuration['name']}-timings.json"
+    with open(filename, "w") as f:
+        json.dump([timing._asdict() for timing in timings], f, indent=2)
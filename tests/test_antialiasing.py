@@ -0,0 +1,37 @@
+from pathlib import Path
+from core import generate_image
+from core.generators import generate_scene
+from core.parallel import generate_tiles
+from core.statistics import Statistics
+import json
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def render_samples(scene, tile=None, samples=5):
+    """
+    Return the number of samples of each pixel of the tile
+    """
+    stats = Statistics()
+    options = {"backend": "analytic", "mode": "wavefront", "samples": samples}
+    generate_image(scene, 2, 60, 40, 1, tile=tile, display=False, stats=stats, **options)
+    return stats.samples
+
+
+def test_tiles_refine_borders():
+    with open(ROOT / "configurations/spheres-config.json", "r") as f:
+        configuration = json.load(f)
+    scene = generate_scene(configuration)
+    reference = render_samples(scene)
+    counts = np.zeros_like(reference)
+    for top, bottom, left, right in generate_tiles(60, 40, 16):
+        counts[top:bottom, left:right] = render_samples(scene, (top, bottom, left, right))
+    assert (reference > 1).any()
+    np.testing.assert_array_equal(counts, reference)
+
+
+def test_samples_rounded_up():
+    with open(ROOT / "configurations/spheres-config.json", "r") as f:
+        scene = generate_scene(json.load(f))
+    assert render_samples(scene, samples=2).max() == 5
@@ -0,0 +1,36 @@
+from pathlib import Path
+from core import Scene, generate_image
+from core.generators import generate_data, generate_lights
+from core.interactive import RenderCache
+import glm, json, vtk
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+WIDTH, HEIGHT, DEPTH = 40, 30, 2
+
+
+def test_intensity_only_shades():
+    with open(ROOT / "configurations/lights-config.json", "r") as f:
+        configuration = json.load(f)
+    zoom = configuration["scene"][2]
+    objects, _, actors = generate_data(configuration["objects"])
+    lights = generate_lights(configuration, actors[configuration.get("target", 0)])
+    camera = vtk.vtkCamera()
+    camera.SetPosition(glm.vec3(configuration["camera"]) * zoom * 5)
+    scene = Scene(objects, actors, lights, camera, display=False)
+    render = lambda: generate_image(
+        scene, DEPTH, WIDTH, HEIGHT, zoom, "analytic", "wavefront", display=False
+    )
+    cache = RenderCache()
+    *_, (image, _) = cache.generate(scene, DEPTH, WIDTH, HEIGHT, zoom)
+    np.testing.assert_allclose(image, render(), atol=1e-6)
+
+    # Attenuated lights reach farther when they are brighter
+    reaches = [light.reach for light in scene.lights]
+    for light in lights:
+        light.SetIntensity(light.GetIntensity() * 4)
+    scene.update(actors, lights, camera)
+    assert all(light.reach > reach for light, reach in zip(scene.lights, reaches))
+    cache.shadow = None  # shadow rays must not be traced again
+    *_, (image, _) = cache.generate(scene, DEPTH, WIDTH, HEIGHT, zoom)
+    np.testing.assert_allclose(image, render(), atol=1e-6)
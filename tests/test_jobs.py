@@ -0,0 +1,44 @@
+from pathlib import Path
+from core.jobs import TIMEOUT, JobQueue
+import farm
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_lost_lease(tmp_path):
+    queue = JobQueue(tmp_path / "farm.db")
+    queue.add("config.json", 4, 2, 1, tmp_path / "image.png", {})
+    job = queue.claim("a")
+    assert job.worker == "a" and job.status == "running"
+    assert queue.checkpoint(job.id, "a", 4, 4)
+    # The worker stops sending checkpoints and the job is taken over
+    queue.connection.execute("UPDATE jobs SET heartbeat = heartbeat - ?", (2 * TIMEOUT,))
+    assert queue.claim("b").worker == "b"
+    assert not queue.checkpoint(job.id, "a", 4, 8)
+    assert not queue.fail(job.id, "a", "error")
+    assert not queue.finish(job.id, "a")
+    (job,) = queue.jobs()
+    assert (job.status, job.worker, job.rendered, job.error) == ("running", "b", 4, None)
+    assert queue.finish(job.id, "b")
+    assert queue.jobs("done")
+    queue.close()
+
+
+def test_outputs_differ(tmp_path):
+    queue = JobQueue(tmp_path / "farm.db")
+    outputs = [queue.add("config.json", 4, 2, 1, tmp_path / "image.png", {})[1] for _ in range(2)]
+    assert outputs[0] != outputs[1]
+    assert [job.output for job in queue.jobs()] == list(map(str, outputs))
+    queue.close()
+
+
+def test_add_configurations(tmp_path):
+    queue = JobQueue(tmp_path / "farm.db")
+    names = ("test-config.json", "spheres-config.json")
+    paths = [str(ROOT / "configurations" / name) for name in names]
+    args = farm.parse_arguments(["add", *paths, "--output", str(tmp_path), "--width", "8"])
+    farm.add(queue, args)
+    jobs = queue.jobs()
+    assert [Path(job.config).name for job in jobs] == ["test-config.json", "spheres-config.json"]
+    assert [job.width for job in jobs] == [8, 8]
+    queue.close()
@@ -0,0 +1,38 @@
+from core.lights import sample_lights
+import numpy as np
+import pytest
+
+# Two points reached by three lights each
+OWNERS = np.array([0, 0, 0, 1, 1, 1])
+SOURCES = np.array([0, 1, 2, 0, 1, 2])
+
+
+@pytest.mark.parametrize(
+    "weights, lit",
+    [
+        ([0, 0, 0, 1, 2, 3], [3, 4, 5]),
+        ([1, 2, 3, 0, 0, 0], [0, 1, 2]),
+    ],
+)
+def test_zero_weights(weights, lit):
+    generator = np.random.default_rng(0)
+    kept, factors = sample_lights(OWNERS, SOURCES, np.array(weights, float), 2, generator)
+    assert 0 < len(kept) <= 2
+    assert np.isin(kept, lit).all()
+    assert (factors > 0).all()
+
+
+def test_all_weights_zero():
+    generator = np.random.default_rng(0)
+    kept, factors = sample_lights(OWNERS, SOURCES, np.zeros(6), 2, generator)
+    assert len(kept) == len(factors) == 0
+
+
+def test_unbiased():
+    generator = np.random.default_rng(0)
+    weights = np.array([1.0, 2.0, 3.0, 0.5, 0.5, 4.0])
+    totals = np.zeros(2)
+    for _ in range(2000):
+        kept, factors = sample_lights(OWNERS, SOURCES, weights, 1, generator)
+        np.add.at(totals, OWNERS[kept], weights[kept] * factors)
+    np.testing.assert_allclose(totals / 2000, [6, 5], rtol=0.05)
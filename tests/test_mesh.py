@@ -0,0 +1,57 @@
+from pathlib import Path
+from core.generators import generate_scene
+from core.raytracing import find_intersections, find_occlusions
+import json
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+RAYS = 200
+
+
+def meshes(name):
+    """
+    Return the data of the meshes of a bundled scene
+    """
+    with open(ROOT / f"configurations/{name}-config.json", "r") as f:
+        configuration = json.load(f)
+    scene = generate_scene(configuration)
+    return [obj.data for obj in scene.objects]
+
+
+def random_rays(data, generator):
+    """
+    Return rays from outside the bounding box of the data towards points inside it
+    (most of them hit it, the others pass between its cells or beside it)
+    """
+    lower, upper = map(np.asarray, data.bounds)
+    size = np.max(upper - lower)
+    targets = lower + generator.random((RAYS, 3)) * (upper - lower)
+    sides = generator.normal(size=(RAYS, 3))
+    origins = targets + 2 * size * sides / np.linalg.norm(sides, axis=1)[:, None]
+    directions = targets - origins
+    return origins, directions / np.linalg.norm(directions, axis=1)[:, None]
+
+
+@pytest.mark.parametrize("name", ["spheres", "bevel-gear", "test"])
+def test_vtk_parity(name, monkeypatch):
+    monkeypatch.chdir(ROOT)  # paths of meshes are relative to the repository
+    generator = np.random.default_rng(0)
+    for data in meshes(name):
+        origins, directions = random_rays(data, generator)
+        distances, cells, points = data.mesh.find_intersections(origins, directions)
+        references = find_intersections(data.obbtree, origins, directions)
+        # vtkOBBTree also reports cells missed by less than its tolerance
+        hit, reference_hit = np.isfinite(distances), np.isfinite(references[0])
+        assert (hit != reference_hit).mean() <= 0.01
+        both = hit & reference_hit
+        np.testing.assert_allclose(distances[both], references[0][both], rtol=1e-6, atol=1e-5)
+        np.testing.assert_allclose(points[both], references[2][both], rtol=1e-6, atol=1e-5)
+        # Rays through an edge hit one of the cells sharing it
+        assert (cells[both] != references[1][both]).mean() <= 0.01
+
+        # Shadow rays stopping before or after the hits
+        lengths = np.where(hit, distances * generator.uniform(0.5, 1.5, RAYS), 1.0)
+        occluded = data.mesh.occluded(origins, directions, lengths)
+        reference = find_occlusions(data.obbtree, origins, directions, lengths)
+        assert occluded.any() and (occluded != reference).mean() <= 0.01
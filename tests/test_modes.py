@@ -0,0 +1,42 @@
+from pathlib import Path
+from core import generate_image
+from core.generators import generate_scene
+import json, os
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def bevel_gear():
+    """
+    Return the scene of the bevel gear (its mesh has vertices with NaN normals)
+    and its zoom, paths of configurations are relative to the repository
+    """
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        with open("configurations/bevel-gear-config.json", "r") as f:
+            configuration = json.load(f)
+        yield generate_scene(configuration), configuration["scene"][2]
+    finally:
+        os.chdir(cwd)
+
+
+def test_finite_normals(bevel_gear):
+    scene, _ = bevel_gear
+    for obj in scene.objects:
+        if obj.data.primitive is None:
+            _, normals, _ = obj.data.shading_arrays()
+            assert np.isfinite(normals).all()
+
+
+def test_modes_agree(bevel_gear):
+    scene, zoom = bevel_gear
+    render = lambda backend, mode: generate_image(
+        scene, 2, 40, 30, zoom, backend=backend, mode=mode, display=False
+    )
+    reference = render("numpy", "wavefront")
+    for backend, mode in [("numpy", "scalar"), ("vtk", "scalar"), ("vtk", "wavefront")]:
+        np.testing.assert_allclose(render(backend, mode), reference, atol=1e-4)
@@ -0,0 +1,80 @@
+from pathlib import Path
+from core.ply import load_ply, to_polydata
+from vtkmodules.util.numpy_support import vtk_to_numpy
+import numpy as np
+import pytest
+import vtk
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def read_vtk(filename):
+    reader = vtk.vtkPLYReader()
+    reader.SetFileName(str(filename))
+    reader.Update()
+    return reader.GetOutput()
+
+
+def arrays(polydata):
+    """
+    Return the points, the connectivity of the cells and the normals of a polydata
+    """
+    polys = polydata.GetPolys()
+    normals = polydata.GetPointData().GetNormals()
+    return (
+        vtk_to_numpy(polydata.GetPoints().GetData()),
+        vtk_to_numpy(polys.GetOffsetsArray()),
+        vtk_to_numpy(polys.GetConnectivityArray()),
+        None if normals is None else vtk_to_numpy(normals),
+    )
+
+
+def write_ply(filename, format, vertices, faces):
+    """
+    Write a PLY file with vertices `(x, y, z, nx, ny, nz)` and faces of the same size
+    """
+    header = [
+        "ply",
+        f"format {format} 1.0",
+        f"element vertex {len(vertices)}",
+        *(f"property float {name}" for name in ("x", "y", "z", "nx", "ny", "nz")),
+        f"element face {len(faces)}",
+        "property list uchar int vertex_indices",
+        "end_header",
+    ]
+    with open(filename, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        if format == "ascii":
+            lines = [" ".join(map(str, vertex)) for vertex in vertices]
+            lines += [" ".join(map(str, [len(face), *face])) for face in faces]
+            f.write(("\n".join(lines) + "\n").encode("ascii"))
+            return
+        order = ">" if format == "binary_big_endian" else "<"
+        f.write(np.asarray(vertices, dtype=order + "f4").tobytes())
+        count = np.dtype([("count", "u1"), ("indexes", order + "i4", (len(faces[0]),))])
+        f.write(np.array([(len(face), face) for face in faces], dtype=count).tobytes())
+
+
+def assert_same(filename):
+    ply = load_ply(filename)
+    assert ply is not None
+    for mapped, read in zip(arrays(to_polydata(ply)), arrays(read_vtk(filename))):
+        np.testing.assert_array_equal(mapped, read)
+
+
+def test_bevel_gear():
+    assert_same(ROOT / "3d-objects/bevel_gear.ply")
+
+
+@pytest.mark.parametrize("format", ["binary_little_endian", "binary_big_endian"])
+def test_quads(tmp_path, format):
+    generator = np.random.default_rng(0)
+    vertices = generator.random((6, 6)).astype(np.float32)
+    faces = [[0, 1, 2, 3], [2, 3, 4, 5]]
+    write_ply(tmp_path / "quads.ply", format, vertices, faces)
+    assert_same(tmp_path / "quads.ply")
+
+
+def test_ascii(tmp_path):
+    write_ply(tmp_path / "ascii.ply", "ascii", [[0, 0, 0, 0, 0, 1]] * 3, [[0, 1, 2]])
+    assert load_ply(tmp_path / "ascii.ply") is None
@@ -0,0 +1,96 @@
+from core.generators import generate_scene
+from core.raytracing import BACKENDS
+from core.wavefront import normalize, surface_normals
+import numpy as np
+import pytest
+
+MATERIAL = [[1, 1, 1], 0.1, 0.6, 1, 100, 0.5]
+CONFIGURATION = {
+    "scene": [10, 10, 1, 1],
+    "objects": [
+        {"item": ["sphere", [150, 150, [0.2, 0.1, -1], 0.5]], "material": MATERIAL},
+        {"item": ["plane", [-0.7]], "material": MATERIAL},  # y = -0.7, |x| and |z| <= 50
+    ],
+    "camera": [0, 0, 1],
+    "light": [[5, 5, 5], 30],
+    "name": "primitives",
+}
+for description in CONFIGURATION["objects"]:
+    description["position"] = [0, 0, 0]
+
+
+@pytest.fixture(scope="module")
+def scene():
+    return generate_scene(CONFIGURATION)
+
+
+def intersect(scene, index, origins, directions):
+    """
+    Return the distances and the normals of the analytic primitive and of the mesh of an object
+    """
+    origins, directions = np.asarray(origins, float), normalize(np.asarray(directions, float))
+    results = []
+    for backend, primitives in (("analytic", True), ("numpy", False)):
+        distances, cells, points = BACKENDS[backend](scene.objects[index], origins, directions)
+        render = scene.compile(primitives, False)
+        hit = np.isfinite(distances)
+        normals = np.full((len(origins), 3), np.nan)
+        indexes = np.full(hit.sum(), index)
+        normals[hit] = surface_normals(render, indexes, cells[hit], points[hit])
+        results.append((distances, normals))
+    return results
+
+
+def test_sphere(scene):
+    center, radius = np.array([0.2, 0.1, -1]), 0.5
+    generator = np.random.default_rng(0)
+    origins = np.tile([0.0, 0.0, 3.0], (200, 1))
+    # Rays towards points around the center, the farthest ones miss the sphere
+    offsets = normalize(generator.normal(size=(200, 3))) * np.linspace(0, 2 * radius, 200)[:, None]
+    directions = normalize(center + offsets - origins)
+    (distances, normals), (mesh_distances, mesh_normals) = intersect(
+        scene, 0, origins, directions
+    )
+    hit = np.isfinite(distances)
+    assert 0 < hit.sum() < len(hit)
+    points = origins[hit] + distances[hit, None] * directions[hit]
+    np.testing.assert_allclose(np.linalg.norm(points - center, axis=1), radius, rtol=1e-9)
+    np.testing.assert_allclose(normals[hit], (points - center) / radius, atol=1e-9)
+
+    # Only rays grazing the silhouette can hit one surface and miss the other
+    both = hit & np.isfinite(mesh_distances)
+    assert (hit != np.isfinite(mesh_distances)).sum() <= 2
+    # The mesh is inscribed in the sphere: its facets are under it by at most the sagittas
+    # of their edges along the parallels and the meridians (150 of each)
+    sagitta = radius * (1 - np.cos(np.pi / 150))
+    cosines = np.abs((normals[both] * directions[both]).sum(axis=1))
+    gaps = mesh_distances[both] - distances[both]
+    assert (gaps >= -1e-9).all() and (gaps <= 2 * sagitta / cosines).all()
+    np.testing.assert_allclose(mesh_normals[both], normals[both], atol=5e-3)
+
+
+def test_quad(scene):
+    # Rays towards points of the plane along its edge z = 50, inside and just outside
+    # its edges x = -50 and x = 50 (and its corners, on the diagonal of its triangles)
+    x = np.array([0.0, 20, -49.9, 49.999999, -49.999999, 50.000001, -50.000001, 80])
+    targets = np.stack((x, np.full(len(x), -0.7), np.full(len(x), 49.999999)), axis=1)
+    origins = np.tile([0.0, 5.0, 0.0], (len(x), 1))
+    (distances, normals), (mesh_distances, mesh_normals) = intersect(
+        scene, 1, origins, targets - origins
+    )
+    expected = np.abs(x) < 50
+    np.testing.assert_array_equal(np.isfinite(distances), expected)
+    np.testing.assert_array_equal(np.isfinite(mesh_distances), expected)
+    np.testing.assert_allclose(distances[expected], mesh_distances[expected], rtol=1e-9)
+    lengths = np.linalg.norm(targets - origins, axis=1)
+    np.testing.assert_allclose(distances[expected], lengths[expected])
+    np.testing.assert_allclose(normals[expected], np.tile([0, 1, 0], (expected.sum(), 1)))
+    np.testing.assert_allclose(mesh_normals[expected], normals[expected], atol=1e-9)
+
+
+def test_quad_grazing(scene):
+    # Parallel to the plane, or leaving it
+    origins = [[0, -0.7 + 1e-9, 0], [0, -0.7, 0], [0, 1, 0]]
+    directions = [[1, 0, 0], [0, 0, 1], [0, 1, 0]]
+    for distances, _ in intersect(scene, 1, origins, directions):
+        assert np.isinf(distances).all()
@@ -0,0 +1,32 @@
+from pathlib import Path
+from core.streaming import stream_image
+import json
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+TILE_SIZE = 16
+
+
+def test_resume(tmp_path):
+    with open(ROOT / "configurations/spheres-config.json", "r") as f:
+        configuration = json.load(f)
+    configuration["scene"] = [40, 30, *configuration["scene"][2:]]
+    render = lambda filename: stream_image(configuration, filename, workers=2, tile_size=TILE_SIZE)
+    render(tmp_path / "whole.npy")
+    whole = np.load(tmp_path / "whole.npy")
+    assert whole[TILE_SIZE:].any()
+
+    # Interrupted rendering: the last tiles were not written
+    filename = tmp_path / "resumed.npy"
+    render(filename)
+    image = np.load(filename, mmap_mode="r+")
+    flags = np.load(tmp_path / "resumed.tiles.npy", mmap_mode="r+")
+    assert flags.all()
+    flags[1:] = 0
+    image[TILE_SIZE:] = 0
+    image.flush(), flags.flush()
+    del image, flags
+
+    render(filename)
+    assert np.load(tmp_path / "resumed.tiles.npy").all()
+    np.testing.assert_array_equal(np.load(filename), whole)